@@ -1,51 +1,48 @@
 import os
-import csv
+import io
 import time
-from typing import List
+import atexit
 
 class BufferedPredictedLeaderWriter:
     """
     缓冲写入预测leader的日志。
-    - 未迁移/预测为本机 → 先放内存
-    - 检测到将要迁移 → 把缓冲+当前记录一次性落到CSV
+    - 未迁移/预测为本机 → 只写进 64 KiB 的 BufferedWriter（满了才落盘）
+    - 检测到将要迁移 → 连同当前记录一次性 flush 到CSV
+    - 进程退出（atexit / main 的 finally）→ close() 落盘剩余缓存
     """
 
+    BUFFER_SIZE = 64 * 1024
+
     def __init__(self, csv_path: str):
         self.csv_path = csv_path
-        self.buffer: List[List[str]] = []
-
-    def _ensure_file(self):
         os.makedirs(os.path.dirname(self.csv_path), exist_ok=True)
-        if not os.path.exists(self.csv_path):
-            with open(self.csv_path, "w", newline="") as f:
-                w = csv.writer(f)
-                w.writerow(["timestamp", "predicted_leader_ip"])
+        raw = open(self.csv_path, "ab", buffering=0)
+        self._fp = io.BufferedWriter(raw, buffer_size=self.BUFFER_SIZE)
+        if raw.tell() == 0:
+            # 行尾保持与原 csv.writer 一致（\r\n）
+            self._fp.write(b"timestamp,predicted_leader_ip\r\n")
+        atexit.register(self.close)
 
-    def _flush_buffer(self):
-        if not self.buffer:
-            return
-        self._ensure_file()
-        with open(self.csv_path, "a", newline="") as f:
-            w = csv.writer(f)
-            w.writerows(self.buffer)
-        self.buffer.clear()
-
-    def record(self, leader_ip: str, will_move: bool):
+    def record(self, leader_ip: str, will_move: bool, flush: bool = True):
         """
         leader_ip: 本次预测的leader（如果是本机，也要写本机IP）
         will_move: 是否需要迁移
+        flush: will_move 时是否在这里立即落盘；调用方自己负责落盘（如与 scp 并发调用
+               flush_remaining）时传 False
         """
         now = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        row = [now, leader_ip]
+        self._fp.write(f"{now},{leader_ip}\r\n".encode())
 
-        if not will_move:
-            # 不迁移 → 只放缓存
-            self.buffer.append(row)
-        else:
+        if will_move and flush:
             # 迁移 → 缓存+当前一起落盘
-            self.buffer.append(row)
-            self._flush_buffer()
+            self._fp.flush()
 
     def flush_remaining(self):
         """程序退出前可调用，落盘还没写出的缓存"""
-        self._flush_buffer()
+        if not self._fp.closed:
+            self._fp.flush()
+
+    def close(self):
+        """落盘并关闭文件；可重复调用。"""
+        if not self._fp.closed:
+            self._fp.close()
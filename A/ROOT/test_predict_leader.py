@@ -0,0 +1,88 @@
+"""
+decide_optimal 与两步路径 find_optimal_leader(build_domains_from_pred_mean(df)) 的一致性测试。
+运行：在本目录下 python -m pytest -q test_predict_leader.py
+"""
+import importlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("tensorflow")   # predict_leader -> forecaster 依赖 tensorflow
+
+MODULES = ["predict_leader", "predict_leader2"]
+
+KNOWN = ["933ca51d2bb602b8", "6181f76d6668aeb0", "b92b49a4de72942d",
+         "3cdaf029c87a002", "69f554c3f7f50a72", "512e070e8eb32959"]
+UNKNOWN = "deadbeefdeadbeef"
+
+
+@pytest.fixture(params=MODULES)
+def calc(request):
+    return importlib.import_module(request.param).OptimalLeaderCalculator()
+
+
+def _pred_df(values: dict, rows: int = 5) -> pd.DataFrame:
+    return pd.DataFrame({c: np.full(rows, v, dtype=np.float32) for c, v in values.items()})
+
+
+def _reference(calc, domains):
+    """原逐候选实现：T(p) = Σ int((R_i + W_i) * L(p, i))，并列取第一个。"""
+    best, best_cost = None, None
+    for cand in domains:
+        total = 0
+        for d in domains:
+            lat = 0 if d.id == cand.id else \
+                calc.latency_matrix[calc.ip_to_index[cand.address]][calc.ip_to_index[d.address]]
+            total += int((d.read_requests + d.write_requests) * lat)
+        if best_cost is None or total < best_cost:
+            best, best_cost = cand, total
+    return best, best_cost
+
+
+def _two_step(calc, df):
+    leader, cost = calc.find_optimal_leader(calc.build_domains_from_pred_mean(df))
+    return (leader.address if leader else None), cost
+
+
+def test_random_frames_match_two_step_and_reference(calc):
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        cols = {}
+        for nid in KNOWN + [UNKNOWN]:
+            for kind in ("write", "read"):
+                if rng.random() < 0.8:          # 偶尔缺列
+                    cols[f"{nid}_{kind}"] = rng.random(7) * rng.choice([0, 1, 500])
+        cols["timestamp_extra"] = rng.random(7)  # 非读写列应被忽略
+        df = pd.DataFrame(cols).astype(np.float32)
+
+        got = calc.decide_optimal(df)
+        assert got == _two_step(calc, df)
+
+        domains = calc.build_domains_from_pred_mean(df)
+        ref, ref_cost = _reference(calc, domains)
+        assert got == ((ref.address if ref else None), ref_cost)
+
+
+def test_tie_takes_first_candidate(calc):
+    # 两个节点在两台主机上、请求相同 → 两个候选代价相同，取排序后的第一个
+    df = _pred_df({"b92b49a4de72942d_write": 10, "b92b49a4de72942d_read": 10,
+                   "933ca51d2bb602b8_write": 10, "933ca51d2bb602b8_read": 10})
+    got = calc.decide_optimal(df)
+    assert got == _two_step(calc, df)
+    assert got == ("192.168.0.38", 600)
+
+
+def test_unknown_ips_are_skipped(calc):
+    df = _pred_df({f"{UNKNOWN}_write": 1000, f"{UNKNOWN}_read": 1000,
+                   "69f554c3f7f50a72_write": 3, "933ca51d2bb602b8_read": 1})
+    got = calc.decide_optimal(df)
+    assert got == _two_step(calc, df)
+    assert got[0] == "192.168.0.223"
+
+
+def test_no_usable_nodes(calc):
+    assert calc.decide_optimal(_pred_df({f"{UNKNOWN}_write": 5})) == (None, None)
+    assert calc.decide_optimal(_pred_df({"933ca51d2bb602b8_write": 0})) == (None, None)
+    assert _two_step(calc, _pred_df({f"{UNKNOWN}_write": 5})) == (None, None)
+    assert calc.decide_optimal(pd.DataFrame()) == (None, None)
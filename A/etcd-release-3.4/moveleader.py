@@ -11,11 +11,26 @@ import time
 from typing import List, Dict, Tuple, Optional
 import requests
 import json
+import logging
+import numpy as np
 
 import os
 import subprocess
 import socket
 
+try:
+    import paramiko
+except ImportError:  # 未安装 paramiko：scp_to_host 只用 scp 子进程
+    paramiko = None
+
+try:
+    import grpc
+    import etcd3
+except ImportError:  # 未安装 python-etcd3：move-leader 只用 etcdctl 子进程
+    etcd3 = None
+
+log = logging.getLogger("moveleader")
+
 class Domain:
     def __init__(self, domain_id: int, address: str, nodes: int, read_requests: int = 0, write_requests: int = 0):
         self.id = domain_id
@@ -42,6 +57,7 @@ class OptimalLeaderCalculator:
             [30, 0,  50],  # 192.168.0.82 到其他节点的延迟  
             [40, 50, 0]    # 192.168.0.223 到其他节点的延迟
         ]
+        self.latency_np = np.asarray(self.latency_matrix, dtype=np.int64)
 
         self.ip_groups = {
             "192.168.0.38": ["933ca51d2bb602b8", "6181f76d6668aeb0", "69948e3d245f62b7"],
@@ -75,6 +91,11 @@ class OptimalLeaderCalculator:
             '512e070e8eb32959': '192.168.0.223'
         }
 
+        # (host, user, port, key) -> (SSHClient, 复用的 SFTP 会话)（懒建立，见 _sftp）
+        self._ssh = {}
+        # "ip:port" -> 复用的 etcd3 gRPC 客户端（懒建立，见 _move_leader）
+        self._etcd = {}
+
     def read_raft_stats(self, csv_path: str) -> List[Domain]:
         """
         读取raft_stats.csv文件的最后一行数据
@@ -82,142 +103,147 @@ class OptimalLeaderCalculator:
         """
         domains = []
         try:
-            with open(csv_path, 'r', encoding='utf-8') as file:
-                reader = csv.reader(file)
-                rows = list(reader)
-                
-                if len(rows) < 2:
-                    print("CSV文件数据不足")
-                    return domains
-                
-                # 获取标题行和最后一行数据
-                header = rows[0]
-                last_row = rows[-1]
-                
-                # print(f"CSV标题行: {header[:5]}...")  # 只显示前5列
-                # print(f"最后一行数据: {last_row[:5]}...")  # 只显示前5列
-                
-                # 解析标题行，提取节点ID
-                node_ids = []
-                for col in header[1:]:  # 跳过timestamp列
-                    if col.endswith('_write'):
-                        node_id = col.replace('_write', '')
-                        node_ids.append(node_id)
-                
-                print(f"发现节点IDs: {node_ids}")
-                
-                # 解析数据行
-                timestamp = last_row[0]
-                col_index = 1
-                
-                for node_id in node_ids:
-                    # 获取该节点的写和读请求数
-                    write_requests = int(last_row[col_index])
-                    read_requests = int(last_row[col_index + 1])
-                    col_index += 2
-                    
-                    # 跳过没有数据的节点
-                    if write_requests == 0 and read_requests == 0:
-                        continue
-                    
-                    # 获取IP地址（需要映射关系）
-                    ip_address = self.node_id_to_ip.get(node_id, "unknown")
-                    if ip_address == "unknown":
-                        print(f"警告: 节点 {node_id} 的IP地址未知，跳过")
-                        continue
-                    
-                    # 假设每个节点只有1个节点（可以根据实际情况调整）
-                    nodes = 1
-                    
-                    domain = Domain(node_id, ip_address, nodes, read_requests, write_requests)
-                    domains.append(domain)
-                    
-                    print(f"解析域信息: ID={node_id[:8]}..., IP={ip_address}, "
-                          f"读请求={read_requests}, 写请求={write_requests}")
-                    
+            header_line, last_line = _read_header_and_last_line(csv_path)
+            if not last_line:
+                log.warning("CSV文件数据不足")
+                return domains
+
+            # 只解析标题行和最后一行数据
+            header, last_row = csv.reader([header_line, last_line])
+
+            # 解析标题行，提取节点ID
+            node_ids = [col[:-len('_write')] for col in header[1:] if col.endswith('_write')]  # 跳过timestamp列
+
+            log.info("发现节点IDs: %s", node_ids)
+
+            # 解析数据行：timestamp 之后按 write, read 成对排列
+            vals = last_row[1:]
+            for node_id, write_requests, read_requests in zip(node_ids, map(int, vals[0::2]), map(int, vals[1::2])):
+                # 跳过没有数据的节点
+                if write_requests == 0 and read_requests == 0:
+                    continue
+
+                # 获取IP地址（需要映射关系）
+                ip_address = self.node_id_to_ip.get(node_id, "unknown")
+                if ip_address == "unknown":
+                    log.warning("警告: 节点 %s 的IP地址未知，跳过", node_id)
+                    continue
+
+                # 假设每个节点只有1个节点（可以根据实际情况调整）
+                nodes = 1
+
+                domain = Domain(node_id, ip_address, nodes, read_requests, write_requests)
+                domains.append(domain)
+
+                log.info("解析域信息: ID=%s..., IP=%s, 读请求=%d, 写请求=%d",
+                         node_id[:8], ip_address, read_requests, write_requests)
+
         except FileNotFoundError:
-            print(f"找不到文件: {csv_path}")
+            log.error("找不到文件: %s", csv_path)
         except Exception as e:
-            print(f"读取CSV文件时发生错误: {e}")
+            log.error("读取CSV文件时发生错误: %s", e)
             
         return domains
 
     def get_latency(self, from_ip: str, to_ip: str) -> int:
         """获取两个IP之间的延迟"""
         if from_ip not in self.ip_to_index or to_ip not in self.ip_to_index:
-            print(f"警告: 未知的IP地址 {from_ip} 或 {to_ip}")
+            log.warning("警告: 未知的IP地址 %s 或 %s", from_ip, to_ip)
             return 999  # 返回一个较大的延迟值
             
         from_idx = self.ip_to_index[from_ip]
         to_idx = self.ip_to_index[to_ip]
         return self.latency_matrix[from_idx][to_idx]
 
-    def calculate_total_latency(self, leader_domain: Domain, domains: List[Domain]) -> int:
-        """
-        计算总加权系统延迟 T(p)
-        T(p) = Σ(i=1 to n) (R_i + W_i) * L(p,i)
-        """
-        leader_ip = leader_domain.address
-        total_latency = 0
-
-        for domain in domains:
-            # 领导者本地延迟为0
-            if domain.id == leader_domain.id:
-                latency = 0
-            else:
-                latency = self.get_latency(leader_ip, domain.address)
-            
-            domain_total_requests = domain.read_requests + domain.write_requests
-            domain_latency = domain_total_requests * latency
-            total_latency += domain_latency
-
-            print(f"  域 {domain.id}: 总请求={domain_total_requests}, 延迟={latency}ms, 域延迟={domain_latency}ms")
-        
-        print(f"总加权延迟 T({leader_domain.id}) = {total_latency}ms")
-        return total_latency
-
-
-    def find_optimal_leader(self, domains: List[Domain]) -> Optional[Domain]:
+    def _domain_soa(self, domains: List[Domain]) -> np.ndarray:
+        """一次遍历 domains 取出 SoA，形状 (4, N)：IP 下标（未知为 -1）、节点数、读请求、写请求。"""
+        get = self.ip_to_index.get
+        return np.array([(get(d.address, -1), d.nodes, d.read_requests, d.write_requests) for d in domains],
+                        dtype=np.int64).T
+
+    def _domain_latency(self, idx: np.ndarray, domains: List[Domain]) -> np.ndarray:
+        """域间延迟子矩阵 L[p, i]（idx 为各域 IP 下标）：对角线（领导者自身）为 0，未知 IP 记 999（同 get_latency）。"""
+        lat = self.latency_np[np.ix_(idx, idx)]
+        unknown = idx < 0
+        if unknown.any():
+            log.warning("警告: 未知的IP地址 %s", [d.address for d, u in zip(domains, unknown) if u])
+            lat[unknown, :] = 999
+            lat[:, unknown] = 999
+        np.fill_diagonal(lat, 0)
+        return lat
+
+    def find_optimal_leader(self, domains: List[Domain]):
         """
         找到最优的领导者域
+        所有候选一次算完：T(p) = Σ(i=1 to n) (R_i + W_i) * L(p,i)，取最小者（并列取第一个）
+        每个候选的明细只在 DEBUG 级别输出
         """
         if not domains:
-            print("没有可用的域")
-            return None
-            
+            log.warning("没有可用的域")
+            return None, None
+
+        # 所有域属性只读一遍，之后全部在数组上计算
+        idx, nodes, reads, writes = self._domain_soa(domains)
+
         # 计算总节点数和法定人数
-        total_nodes = sum(domain.nodes for domain in domains)
+        total_nodes = int(nodes.sum())
         quorum_size = math.floor(total_nodes / 2) + 1
-        
-        print(f"总节点数: {total_nodes}")
-        print(f"法定人数: {quorum_size}")
-        print(f"域数量: {len(domains)}")
-        print("=" * 50)
-        
-        min_total_latency = float('inf')
-        optimal_leader = None
-        
-        # 遍历每个域作为潜在领导者
-        for leader_candidate in domains:
-            print(f"计算领导者候选域 {leader_candidate.id} (IP: {leader_candidate.address})...")
-            
-            # 2. 计算总系统延迟  
-            total_latency = self.calculate_total_latency(leader_candidate, domains)
-            print(f"  总加权延迟 T({leader_candidate.id}): {total_latency}")
-            print("-" * 30)
-            
-            # 3. 更新最优领导者
-            if total_latency < min_total_latency:
-                min_total_latency = total_latency  
-                optimal_leader = leader_candidate
-                
-        return optimal_leader, min_total_latency if optimal_leader else (None, None)
+
+        req = reads + writes
+        lat = self._domain_latency(idx, domains)
+        costs = lat @ req
+        best = int(costs.argmin())
+
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("总节点数: %d，法定人数: %d，域数量: %d", total_nodes, quorum_size, len(domains))
+            for p, cand in enumerate(domains):
+                log.debug("计算领导者候选域 %s (IP: %s)...", cand.id, cand.address)
+                for i, domain in enumerate(domains):
+                    log.debug("  域 %s: 总请求=%d, 延迟=%dms, 域延迟=%dms", domain.id, req[i], lat[p, i], req[i] * lat[p, i])
+                log.debug("  总加权延迟 T(%s): %d", cand.id, costs[p])
+
+        return domains[best], int(costs[best])
+
+    def _sftp(self, host, user, port, key):
+        """取 (host, user, port, key) 对应的 SFTP 会话；没有或连接已断开时重新握手。"""
+        k = (host, user, port, key)
+        hit = self._ssh.get(k)
+        if hit is not None and hit[1].get_channel().get_transport().is_active():
+            return hit[1]
+        self._drop_sftp(k)
+        client = paramiko.SSHClient()
+        client.load_system_host_keys()   # 与 scp 一样只信任 known_hosts 里的主机
+        try:
+            client.connect(host, port=port, username=user, key_filename=key, compress=True)
+            sftp = client.open_sftp()
+        except BaseException:
+            client.close()
+            raise
+        self._ssh[k] = (client, sftp)
+        return sftp
+
+    def _drop_sftp(self, k):
+        """移出缓存并关闭 SFTP 会话及其 SSHClient，避免泄漏连接"""
+        hit = self._ssh.pop(k, None)
+        if hit is not None:
+            client, sftp = hit
+            sftp.close()
+            client.close()
 
     def scp_to_host(self, local_file, host, remote_path, user="root", port=22, key=None):
         if not os.path.exists(local_file):
             raise FileNotFoundError(f"本地文件不存在: {local_file}")
             return
 
+        if paramiko is not None:
+            try:
+                self._sftp(host, user, port, key).put(local_file, remote_path)
+                log.info("文件已传到 %s:%s（SFTP）", host, remote_path)
+                return
+            except (paramiko.SSHException, OSError) as e:
+                self._drop_sftp((host, user, port, key))
+                log.warning("SFTP 传输失败: %s，改用 scp", e)
+
         scp_cmd = ["scp"]
         if key:
             scp_cmd += ["-i", key]
@@ -225,9 +251,30 @@ class OptimalLeaderCalculator:
             scp_cmd += ["-P", str(port)]  # 注意 scp 使用大写 P 指定端口
         scp_cmd += [local_file, f"{user}@{host}:{remote_path}"]
 
-        print("执行文件传输命令：", " ".join(scp_cmd))
+        log.info("执行文件传输命令：%s", " ".join(scp_cmd))
         subprocess.run(scp_cmd, check=True)
-        print(f"文件已传到 {host}:{remote_path}")
+        log.info("文件已传到 %s:%s", host, remote_path)
+
+    def _move_leader(self, leader_endpoint, target_id, cmd):
+        """优先经 gRPC Maintenance.MoveLeader 迁移（复用缓存的客户端）；未安装 etcd3 或 RPC 失败时执行 etcdctl cmd。"""
+        if etcd3 is not None:
+            try:
+                c = self._etcd.get(leader_endpoint)
+                if c is None:
+                    host, port = leader_endpoint.rsplit(":", 1)
+                    c = self._etcd[leader_endpoint] = etcd3.client(host=host, port=int(port))
+                req = etcd3.etcdrpc.MoveLeaderRequest(targetID=int(target_id, 16))
+                c.maintenancestub.MoveLeader(req, c.timeout)
+                log.info("MoveLeader RPC: %s -> %s", leader_endpoint, target_id)
+                return
+            except (grpc.RpcError, ValueError) as e:
+                c = self._etcd.pop(leader_endpoint, None)
+                if c is not None:
+                    c.close()
+                log.warning("MoveLeader RPC 失败: %s，改用 etcdctl", e)
+
+        log.info("执行命令: %s", " ".join(cmd))
+        subprocess.run(cmd, check=True)
 
     def check_and_transfer_leader(self, current_leader_ip: str, optimal_leader_ip: str):
         local_path = "/etcd/etcd-release-3.4/raft_stats.csv"
@@ -244,18 +291,37 @@ class OptimalLeaderCalculator:
             "move-leader",
             self.IpToId.get(endpoint, "unknown")
         ]
-        print("执行命令:", " ".join(cmd))
-
-        subprocess.run(cmd, check=True)
-        print("success")
+        self._move_leader(current_leader_url, cmd[-1], cmd)
+        log.info("success")
 
         os.remove(local_path)
-        print(f"已删除本地文件 {local_path}")
+        log.info("已删除本地文件 %s", local_path)
         
         return 1
 
 
 
+def _read_header_and_last_line(csv_path: str, block: int = 4096) -> Tuple[str, str]:
+    """
+    只读 CSV 的标题行和最后一个非空行（从文件尾按块回扫到换行符），与文件大小无关。
+    只有标题行时返回的最后一行为空串。
+    """
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        data_start = f.tell()
+        pos = f.seek(0, os.SEEK_END)
+        buf = b""
+        while pos > data_start:
+            step = min(block, pos - data_start)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + buf
+            if b"\n" in buf.rstrip(b"\r\n"):
+                break
+    last = buf.rstrip(b"\r\n").rsplit(b"\n", 1)[-1]
+    return header.decode('utf-8'), last.decode('utf-8')
+
+
 def get_current_leader_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
@@ -268,18 +334,19 @@ def get_current_leader_ip():
 
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
     calculator = OptimalLeaderCalculator()
     
     # CSV文件路径
     csv_path = "raft_stats.csv"
     
-    print("开始计算最优Raft领导者...")
-    print("=" * 50)
+    log.info("开始计算最优Raft领导者...")
+    log.info("=" * 50)
     
     # 1. 读取域数据（按IP分组）
     domains = calculator.read_raft_stats(csv_path)
     if not domains:
-        print("无法读取域数据，程序退出")
+        log.error("无法读取域数据，程序退出")
         return
     
     # 2. 计算最优领导者
@@ -287,12 +354,9 @@ def main():
     
     # 3. 输出结果
     if optimal_leader:
-        print(f"\n🎯 最优领导者:")
-        print(f"   域IP: {optimal_leader.address}")
-        print(f"   节点数: {optimal_leader.nodes}")
-        print(f"   读请求: {optimal_leader.read_requests}")
-        print(f"   写请求: {optimal_leader.write_requests}")
-        print(f"   最小总加权延迟: {min_latency}")
+        log.info("🎯 最优领导者: 域IP=%s, 节点数=%d, 读请求=%d, 写请求=%d, 最小总加权延迟=%d",
+                 optimal_leader.address, optimal_leader.nodes, optimal_leader.read_requests,
+                 optimal_leader.write_requests, min_latency)
         
         # 4. 获取当前领导者并考虑转移
         current_leader_ip = get_current_leader_ip()
@@ -300,23 +364,23 @@ def main():
 
 
         if current_leader_ip:
-            print(f"\n📍 当前领导者IP: {current_leader_ip}")
-            print(f"📍 最优领导者IP: {optimal_leader.address}")
+            log.info("📍 当前领导者IP: %s", current_leader_ip)
+            log.info("📍 最优领导者IP: %s", optimal_leader.address)
             
             if current_leader_ip != optimal_leader.address:
-                print("\n🔄 需要进行领导者转移")
+                log.info("🔄 需要进行领导者转移")
                 success = calculator.check_and_transfer_leader(current_leader_ip, optimal_leader.address)
                 if success:
-                    print("✅ 领导者转移完成")
+                    log.info("✅ 领导者转移完成")
                 else:
-                    print("❌ 领导者转移失败")
+                    log.error("❌ 领导者转移失败")
             else:
-                print("✅ 当前领导者已经是最优选择")
+                log.info("✅ 当前领导者已经是最优选择")
         else:
-            print("⚠️  无法获取当前领导者信息")
+            log.warning("⚠️  无法获取当前领导者信息")
             
     else:
-        print("\n❌ 无法确定最优领导者（可能无法达到法定人数）")
+        log.error("❌ 无法确定最优领导者（可能无法达到法定人数）")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
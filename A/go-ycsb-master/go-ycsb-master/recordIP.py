@@ -2,10 +2,11 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Sequence
 import csv
-import os
+
+import numpy as np
 
 
 def write_hotspot_plan(
@@ -41,16 +42,19 @@ def write_hotspot_plan(
     if total_slots <= 0:
         raise ValueError("规划时长太短，无法生成任何条目")
 
-    new_file = not os.path.exists(out_csv)
-    with open(out_csv, "a", newline="", encoding="utf-8") as f:
+    # 一次性算出全部时间点与轮转 IP（NumPy 向量化，不再逐行 timedelta + strftime）
+    slots = np.arange(total_slots)
+    times = np.datetime64(t0, "s") + slots * np.timedelta64(slot_secs, "s")
+    stamps = np.char.replace(np.datetime_as_string(times, unit="s"), "T", " ")
+    ips = np.asarray(domain_ips)[(first_idx + slots) % len(domain_ips)]
+
+    # 64 KiB 块缓冲；追加模式下 tell()==0 即空文件，需要先写表头
+    with open(out_csv, "a", newline="", encoding="utf-8", buffering=1 << 16) as f:
         w = csv.writer(f)
-        if new_file:
+        if f.tell() == 0:
             w.writerow(["time", "ip"])
-        for s in range(total_slots):
-            when = t0 + timedelta(seconds=s * slot_secs)
-            dom_idx = (first_idx + s) % len(domain_ips)
-            ip = domain_ips[dom_idx]
-            w.writerow([when.strftime("%Y-%m-%d %H:%M:%S"), ip])
+        # 直接迭代数组（惰性 zip），不再额外物化两份 Python list
+        w.writerows(zip(stamps, ips))
 
     return out_csv
 
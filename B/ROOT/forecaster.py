@@ -1,32 +1,62 @@
 # forecaster.py
+import os
 import numpy as np
 import pandas as pd
+import tensorflow as tf
 from joblib import load as joblib_load
 from tensorflow.keras.models import load_model
 
 from ts_common import (
     ensure_timestamp,      # 正确名称：没有下划线
     infer_step_delta,      # 正确名称：没有下划线
-    safe_inverse_transform # 反缩放并裁负值
 )
 
 class Forecaster:
     def __init__(self, model_path: str, scaler_path: str, meta_path: str):
         import json
-        self.model  = load_model(model_path)
         self.scaler = joblib_load(scaler_path)
         with open(meta_path, "r", encoding="utf-8") as f:
             meta = json.load(f)
         self.feature_cols = list(meta["columns"])
         self.look_back    = int(meta["look_back"])
         self.horizon      = int(meta["horizon"])
+        # MinMaxScaler 的闭式仿射参数：x_scaled = x * scale_ + min_
+        self._scale = np.asarray(self.scaler.scale_, dtype=np.float32)
+        self._min   = np.asarray(self.scaler.min_, dtype=np.float32)
+        # 模型输入的预分配缓冲 (1, look_back, F)，每次预测原地覆盖
+        self._X_buf = np.empty((1, self.look_back, len(self.feature_cols)), dtype=np.float32)
+
+        # 训练端导出的 FP16 TFLite 模型（不比 .h5 旧）存在时优先用它推理
+        self.model   = None
+        self._infer  = None
+        self._tflite = None
+        tflite_path = model_path + ".fp16.tflite"
+        if os.path.exists(tflite_path) and os.path.getmtime(tflite_path) >= os.path.getmtime(model_path):
+            self._tflite = tf.lite.Interpreter(model_path=tflite_path)
+            self._tfl_in  = self._tflite.get_input_details()[0]["index"]
+            self._tfl_out = self._tflite.get_output_details()[0]["index"]
+            self._tflite.resize_tensor_input(self._tfl_in, list(self._X_buf.shape))
+            self._tflite.allocate_tensors()
+            return
+
+        self.model = load_model(model_path)
+        # 单样本前向：固定输入形状，一次追踪成具体函数，绕开 Keras predict 的调度开销；
+        # 优先用 XLA 把 LSTM/矩阵乘/激活融合编译，并在加载时用全零输入预热（编译不落在预测路径上）
+        spec = tf.TensorSpec([1, self.look_back, len(self.feature_cols)], tf.float32)
+        forward = lambda x: self.model(x, training=False)
+        try:
+            self._infer = tf.function(forward, jit_compile=True).get_concrete_function(spec)
+            self._infer(tf.zeros(spec.shape, dtype=spec.dtype))
+        except (tf.errors.OpError, ValueError):  # 模型里有 XLA 不支持的算子：退回普通图执行
+            self._infer = tf.function(forward).get_concrete_function(spec)
 
     def predict(
         self,
         data,                       # 路径或 DataFrame
         use_last_rows: int | None = None,
         fixed_step_sec: int | None = None,
-        return_dataframe: bool = True
+        return_dataframe: bool = True,
+        dtype=None                  # 输出精度，如 np.float32；None 保持反缩放结果的原精度
     ):
         # 读数据
         if isinstance(data, str):
@@ -45,17 +75,26 @@ class Forecaster:
         needed = ["timestamp"] + TRAIN_FEATURES
         df = df.loc[:, needed]  # 按列名精确选取
 
-        # 确保全是 float
-        for c in TRAIN_FEATURES:
-            df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0.0)
-
-        df = ensure_timestamp(df, col="timestamp")  # ← 正确函数名
+        # 确保全是 float32：一次整块转换（非数值 → NaN → 0.0），不再逐列 to_numeric/fillna/astype
+        feats = df[TRAIN_FEATURES]
+        if not all(pd.api.types.is_numeric_dtype(t) for t in feats.dtypes):
+            feats = feats.apply(pd.to_numeric, errors="coerce")
+        arr = feats.to_numpy(dtype=np.float32)
+        arr[np.isnan(arr)] = 0.0
+        df[TRAIN_FEATURES] = arr
+
+        if fixed_step_sec is None:
+            df = ensure_timestamp(df, col="timestamp")  # ← 正确函数名
+            raw_ts = None
+        else:
+            # 固定步长时只用到最后一个时间戳：不转换整列、不设索引，也不推断步长
+            raw_ts = df["timestamp"]
 
         # 对齐列
         missing = [c for c in self.feature_cols if c not in df.columns]
         if missing:
             raise ValueError(f"输入缺少训练时的特征列: {missing}")
-        df = df[self.feature_cols].astype("float32").dropna()
+        df = df[self.feature_cols]   # 已是 float32 且无 NaN
 
         total_len = len(df)
         if total_len < self.look_back:
@@ -68,26 +107,36 @@ class Forecaster:
         if N > total_len:
             N = total_len
 
-        hist_values = df.iloc[-N:].values
-        hist_index  = df.index[-N:]
+        # 只对最后 look_back 行做标准化，直接写进预分配的输入缓冲
+        X = self._X_buf[0]
+        np.multiply(df.to_numpy(dtype=np.float32, copy=False)[-self.look_back:], self._scale, out=X)
+        X += self._min
 
-        # 标准化 & 取最后 look_back
-        X = self.scaler.transform(hist_values)[-self.look_back:, :][np.newaxis, ...]
-
-        # 预测（反缩放用 safe_inverse_transform）
-        preds_scaled = self.model.predict(X, verbose=0)[0]
-        preds = safe_inverse_transform(self.scaler, preds_scaled)
+        # 预测；反缩放 (y - min_) / scale_ 并裁掉负值（同 safe_inverse_transform）
+        if self._tflite is not None:
+            self._tflite.set_tensor(self._tfl_in, self._X_buf)
+            self._tflite.invoke()
+            preds_scaled = self._tflite.get_tensor(self._tfl_out)[0]
+        else:
+            preds_scaled = self._infer(tf.constant(self._X_buf)).numpy()[0]
+        preds = (preds_scaled - self._min) / self._scale
+        np.maximum(preds, 0, out=preds)
+        if dtype is not None:
+            preds = np.asarray(preds, dtype=dtype)
 
         # 时间索引
-        if fixed_step_sec is not None:
+        if raw_ts is not None:
             step = pd.Timedelta(seconds=int(fixed_step_sec))
+            last_ts = pd.to_datetime(raw_ts.iat[-1], unit="s")
         else:
+            hist_index = df.index[-N:]
             step = infer_step_delta(hist_index)  # ← 正确函数名
             # 兜底：推断失败则回退 1s
             if pd.isna(step) or step <= pd.Timedelta(0):
                 step = pd.Timedelta(seconds=1)
+            last_ts = hist_index[-1]
 
-        start_ts = hist_index[-1] + step
+        start_ts = last_ts + step
         future_index = pd.date_range(start=start_ts, periods=self.horizon, freq=step)
 
         if return_dataframe:
@@ -1,10 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import os, time, shutil, signal, subprocess, urllib.request, re
+import os, sys, time, shutil, signal, subprocess, http.client, urllib.parse, re
+import atexit, queue, threading
 from datetime import datetime
 from pathlib import Path
 
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # 非 Linux / 未安装 inotify_simple：csv_is_stable 退回 stat 轮询
+    INotify = None
+
 # ===== 可配置 =====
 METRICS_URL = os.environ.get("ETCD_METRICS_URL", "http://192.168.0.82:2379/metrics")
 SRC_CSV     = os.environ.get("RAFT_CSV_PATH", "/etcd/etcd-release-3.4/raft_stats.csv")
@@ -41,31 +47,133 @@ def _handle_stop(signum, frame):
 for sig in (signal.SIGINT, signal.SIGTERM):
     signal.signal(sig, _handle_stop)
 
+# 日志文件由后台线程用一个常驻、行缓冲的句柄写入；log() 只入队，不再每行 open/close
+_log_q: "queue.Queue" = queue.Queue()
+
+LOG_RETRY_MAX = 60.0  # 日志文件打不开时的最大重试间隔（秒）
+
+def _drain_log():
+    fp = None
+    next_try, backoff = 0.0, 1.0
+    warned = False
+    for line in iter(_log_q.get, None):
+        if fp is None:
+            now = time.monotonic()
+            if now < next_try:
+                continue   # 退避期内丢弃文件日志（stdout 仍有）
+            try:
+                fp = open(LOG_PATH, "a", buffering=1, encoding="utf-8")
+                backoff = 1.0
+            except OSError as e:
+                next_try, backoff = now + backoff, min(backoff * 2, LOG_RETRY_MAX)
+                if not warned:   # 只提示一次，避免刷屏
+                    print(f"[WARN] 无法写日志文件 {LOG_PATH}: {e}，将退避重试", file=sys.stderr, flush=True)
+                    warned = True
+                continue
+        try:
+            fp.write(line)
+        except OSError as e:
+            # 写失败（磁盘满、文件系统异常等）：关掉句柄，下一行重新打开
+            try:
+                fp.close()
+            except OSError:
+                pass
+            fp = None
+            if not warned:
+                print(f"[WARN] 写日志文件 {LOG_PATH} 失败: {e}，将退避重试", file=sys.stderr, flush=True)
+                warned = True
+    if fp is not None:
+        fp.close()
+
+_log_thread = threading.Thread(target=_drain_log, name="log-writer", daemon=True)
+_log_thread.start()
+
+@atexit.register
+def _close_log():
+    # 退出前让后台线程写完队列里剩余的行
+    _log_q.put(None)
+    _log_thread.join(timeout=2)
+
 def log(msg: str):
     ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     line = f"[{ts}] {msg}"
     print(line, flush=True)
-    try:
-        with open(LOG_PATH, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
-    except Exception:
-        pass
+    _log_q.put_nowait(line + "\n")
+
+# 只匹配样本行（行首锚定，避开 "# HELP/# TYPE etcd_server_is_leader" 注释行）；直接在 bytes 上匹配，免 decode
+_LEADER_RE = re.compile(rb"^etcd_server_is_leader\s+([01])\s*$", re.M)
+
+# metrics 探测复用同一条 keep-alive 连接（懒建立，出错即丢弃重建），不再每 3s 重新握手
+_metrics_url = urllib.parse.urlsplit(METRICS_URL)
+_metrics_path = _metrics_url.path or "/"
+if _metrics_url.query:
+    _metrics_path += "?" + _metrics_url.query
+_metrics_conn = None
+
+def _reset_metrics_conn():
+    global _metrics_conn
+    if _metrics_conn is not None:
+        _metrics_conn.close()
+        _metrics_conn = None
 
 def is_leader() -> bool:
-    try:
-        with urllib.request.urlopen(METRICS_URL, timeout=2) as resp:
-            text = resp.read().decode("utf-8", errors="ignore")
-        m = re.search(r"^etcd_server_is_leader\s+([01])\s*$", text, re.M)
-        return bool(m and m.group(1) == "1")
-    except Exception as e:
-        log(f"[WARN] metrics 获取失败: {e}")
-        return False
+    global _metrics_conn
+    for attempt in (1, 2):
+        try:
+            if _metrics_conn is None:
+                conn_cls = http.client.HTTPSConnection if _metrics_url.scheme == "https" else http.client.HTTPConnection
+                _metrics_conn = conn_cls(_metrics_url.hostname, _metrics_url.port, timeout=2)
+            _metrics_conn.request("GET", _metrics_path)
+            resp = _metrics_conn.getresponse()
+            text = resp.read()   # 读完响应体，连接才能复用
+            if resp.status != 200:
+                raise http.client.HTTPException(f"HTTP {resp.status} {resp.reason}")
+            m = _LEADER_RE.search(text)
+            return bool(m and m.group(1) == b"1")
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            # 空闲的 keep-alive 连接被服务端关掉：重连后立刻重试一次
+            _reset_metrics_conn()
+            if attempt == 1:
+                continue
+            log(f"[WARN] metrics 获取失败: {e}")
+            return False
+        except Exception as e:
+            _reset_metrics_conn()
+            log(f"[WARN] metrics 获取失败: {e}")
+            return False
 
 def _stat_tuple(path: str):
     st = os.stat(path)
     return (st.st_size, getattr(st, "st_mtime_ns", int(st.st_mtime * 1e9)))
 
+_inotify = None   # 进程内复用的 inotify 实例（懒创建）
+
 def csv_is_stable(path: str, window: float = CSV_STABLE_WINDOW) -> bool:
+    """window 内 CSV 没有写入/关闭写/移动/删除事件即视为稳定；有事件立刻返回 False。"""
+    global _inotify
+    if INotify is None:
+        return _csv_is_stable_poll(path, window)
+    try:
+        if _inotify is None:
+            _inotify = INotify()
+        wd = _inotify.add_watch(path, inotify_flags.MODIFY | inotify_flags.CLOSE_WRITE
+                                | inotify_flags.MOVE_SELF | inotify_flags.DELETE_SELF)
+    except FileNotFoundError:
+        return False
+    except OSError:  # inotify 实例 / watch 数量用尽等
+        return _csv_is_stable_poll(path, window)
+    # watch 只在本次判断内有效：结束即移除，文件被 rename 替换后不会在旧 inode 上残留、累积
+    try:
+        _inotify.read(timeout=0)   # 丢弃窗口开始前积压的事件（含上次 rm_watch 的 IGNORED）
+        events = _inotify.read(timeout=int(window * 1000))
+        return not any(e.wd == wd and not e.mask & inotify_flags.IGNORED for e in events)
+    finally:
+        try:
+            _inotify.rm_watch(wd)
+        except OSError:  # 文件已删除时内核已自动移除该 watch
+            pass
+
+def _csv_is_stable_poll(path: str, window: float) -> bool:
     try:
         s1 = _stat_tuple(path)
         time.sleep(window)
@@ -74,6 +182,21 @@ def csv_is_stable(path: str, window: float = CSV_STABLE_WINDOW) -> bool:
     except FileNotFoundError:
         return False
 
+def _copy_file(src: Path, dst: Path):
+    """内核态 sendfile 拷贝到 EOF（不经用户态缓冲、不复制元数据）；无 sendfile 时退回 shutil.copyfile。"""
+    if not hasattr(os, "sendfile"):
+        shutil.copyfile(src, dst)
+        return
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fsrc.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        offset = 0
+        while True:
+            sent = os.sendfile(fdst.fileno(), fsrc.fileno(), offset, 1 << 30)
+            if sent == 0:
+                break
+            offset += sent
+
 def snapshot_csv(src: str, snap_dir: str) -> str:
     Path(snap_dir).mkdir(parents=True, exist_ok=True)
     src_p = Path(src)
@@ -85,7 +208,7 @@ def snapshot_csv(src: str, snap_dir: str) -> str:
                 raise RuntimeError("CSV 不稳定（写入中或被移动）")
             ts = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
             dst_p = Path(snap_dir) / f"{src_p.stem}-{ts}{src_p.suffix}"
-            shutil.copy2(src_p, dst_p)
+            _copy_file(src_p, dst_p)   # 快照训练完即删，无需保留 mtime 等元数据
             if src_p.stat().st_size != dst_p.stat().st_size:
                 raise RuntimeError("快照大小校验失败")
             return str(dst_p)
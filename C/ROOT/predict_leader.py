@@ -7,12 +7,15 @@ Optimal Raft Leader Calculator (预测驱动版)
 """
 
 import argparse
-import csv
-import math
+import asyncio
+import functools
+import io
 import os
+import signal
 import socket
 import subprocess
 import sys
+from collections import deque
 from typing import List, Optional
 import time
 from datetime import datetime
@@ -20,16 +23,33 @@ import numpy as np
 import pandas as pd
 from forecaster import Forecaster
 
-import threading               # ← NEW: 你用到了 threading.RLock/Thread
+import threading               # ← NEW: 你用到了 threading.Thread/Event/Timer
 from pathlib import Path
 import hashlib 
+import logging
+import mmap
 
 from leader_logger import BufferedPredictedLeaderWriter
 
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # 未安装 watchdog：ReloadWorker 退回 stat 轮询
+    FileSystemEventHandler = object
+    Observer = None
+
+try:
+    import xxhash
+    _hasher = xxhash.xxh3_128   # 仅做变更检测，不需要密码学强度
+except ImportError:  # 未安装 xxhash：退回 sha256
+    _hasher = hashlib.sha256
+
+log = logging.getLogger("predict_leader")
+
 
 class ModelReloader:
     """
-    通过 mtime 或 sha256 监控 model/scaler/meta 是否变化；变化且稳定后触发 reload。
+    通过 mtime 或文件哈希（xxh3_128，缺省退回 sha256）监控 model/scaler/meta 是否变化；变化且稳定后触发 reload。
     - use_hash=False: 仅看 mtime，性能好；需训练端原子重命名发布，配合 debounce。
     - use_hash=True : 看文件哈希，更稳但更耗时（大文件会慢）。
     """
@@ -42,27 +62,57 @@ class ModelReloader:
         }
         self.debounce = debounce_sec
         self.use_hash = use_hash
+        # path -> (st_size, st_mtime_ns, sha_hex)；stat 不变就不重新哈希
+        self._hash_cache: dict[Path, tuple[int, int, str]] = {}
         self.last_sig = self._signature()   # 记录已加载版本的签名（mtime 或 hash）
         self.last_seen_change_ts = 0.0      # 最近一次发现“不同”的时间，用于去抖
+        self._fast_key: Optional[tuple[int, int]] = None  # 已加载 meta 的 (st_size, st_mtime_ns)
 
-    def _hash(self, p: Path, bs: int = 1<<20) -> str:
-        h = hashlib.sha256()
+    def _hash(self, p: Path) -> str:
         with p.open("rb") as f:
-            for chunk in iter(lambda: f.read(bs), b""):
-                h.update(chunk)
-        return h.hexdigest()
+            if hasattr(hashlib, "file_digest"):   # Python 3.11+：整段交给 C 层哈希
+                return hashlib.file_digest(f, _hasher).hexdigest()
+            h = _hasher()
+            if os.fstat(f.fileno()).st_size:      # mmap 不接受空文件
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    h.update(mm)
+            return h.hexdigest()
+
+    def _hash_cached(self, p: Path, st: os.stat_result) -> str:
+        hit = self._hash_cache.get(p)
+        if hit is not None and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+        digest = self._hash(p)
+        self._hash_cache[p] = (st.st_size, st.st_mtime_ns, digest)
+        return digest
 
     def _signature(self) -> dict:
         sig = {}
         for k, p in self.paths.items():
-            if not p.exists():
+            try:
+                st = p.stat()   # 一次 stat 同时判断存在与取 mtime
+            except FileNotFoundError:
                 sig[k] = None
-            else:
-                sig[k] = self._hash(p) if self.use_hash else p.stat().st_mtime
+                continue
+            sig[k] = self._hash_cached(p, st) if self.use_hash else st.st_mtime
         return sig
 
+    def _meta_key(self) -> Optional[tuple[int, int]]:
+        try:
+            st = os.stat(self.paths["meta"])
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
     def changed_and_stable(self) -> bool:
         """返回：是否发现新版本且已稳定（不再变化至少 debounce_sec 秒）"""
+        # 快路径：meta 是训练端最后写出的文件，它未变说明没有新一轮发布，只花一次 stat；
+        # 若 reload 恰好发生在 model 已写、meta 未写之间，meta 随后变化仍会触发下一次 reload
+        key = self._meta_key()
+        if key is not None and key == self._fast_key:
+            self.last_seen_change_ts = 0.0
+            return False
+
         cur = self._signature()
         if cur == self.last_sig:                 # 签名完全一致，无变化
             self.last_seen_change_ts = 0.0
@@ -80,27 +130,53 @@ class ModelReloader:
 
         return False
 
+    def changed(self) -> bool:
+        """签名与已加载版本不同（不做去抖，供事件驱动路径在静默期后调用）"""
+        return self._signature() != self.last_sig
+
     def mark_loaded(self):
         """在成功 reload 后调用，更新“已加载签名”并清理去抖状态。"""
         self.last_sig = self._signature()
         self.last_seen_change_ts = 0.0
+        self._fast_key = self._meta_key()
 
 class ForecasterHolder:
-    """线程安全地存放/读取当前 forecaster。"""
+    """
+    线程安全地存放/读取当前 forecaster。
+    只有单个属性的读/重绑定：在 CPython（GIL）下引用赋值本身是原子的，
+    读者要么拿到旧对象要么拿到新对象，因此 get/set 不加锁。
+    以后若加入“读-改-写”之类的复合操作，再为那部分单独加锁。
+    """
+    __slots__ = ("_f",)
     def __init__(self, forecaster):
         self._f = forecaster
-        self._lock = threading.RLock()
     def get(self):
-        with self._lock:
-            return self._f
+        return self._f
     def set(self, fnew):
-        with self._lock:
-            self._f = fnew
+        self._f = fnew
+
+
+class _ModelFileHandler(FileSystemEventHandler):
+    """watchdog 回调：只关心 model/scaler/meta 三个文件的创建/写入/改名。"""
+    def __init__(self, watched: set, on_change):
+        super().__init__()
+        self.watched = watched
+        self.on_change = on_change
+
+    def on_any_event(self, event):
+        if event.is_directory:
+            return
+        for path in (event.src_path, getattr(event, "dest_path", "")):
+            if path and os.path.abspath(path) in self.watched:
+                self.on_change()
+                return
 
 
 class ReloadWorker(threading.Thread):
     """
-    后台线程：每 interval_sec 检查一次；若模型更新且稳定，则重建 Forecaster 并无缝替换。
+    后台线程：若模型更新且稳定，则重建 Forecaster 并无缝替换。
+    - 装了 watchdog：监听文件所在目录，事件后静默 debounce 秒再检查，稳态下零唤醒
+    - 否则：每 interval_sec 轮询一次 stat
     """
     daemon = True  # 随主进程退出
     def __init__(self, holder: ForecasterHolder,
@@ -116,22 +192,106 @@ class ReloadWorker(threading.Thread):
                                    debounce_sec=debounce_sec, use_hash=use_hash)
         self.stop_evt = threading.Event()
         self.guard.mark_loaded()
+        self._timer: Optional[threading.Timer] = None
+        self._reload_lock = threading.Lock()
 
     def stop(self):
         self.stop_evt.set()
 
+    def _reload(self):
+        self.on_log("[RELOAD] 检测到新模型，开始热更新…")
+        fnew = self.ctor()  # 创建新 forecaster
+        self.holder.set(fnew)  # 原子替换
+        self.guard.mark_loaded()
+        self.on_log("[RELOAD] 热更新完成。")
+
     def run(self):
+        if Observer is not None:
+            try:
+                self._run_watch()
+                return
+            except Exception as e:
+                self.on_log(f"[WARN] 文件监听启动失败，改用轮询：{e!r}")
+        self._run_poll()
+
+    def _run_poll(self):
         while not self.stop_evt.wait(self.interval):
             try:
                 if self.guard.changed_and_stable():
-                    self.on_log("[RELOAD] 检测到新模型，开始热更新…")
-                    fnew = self.ctor()  # 创建新 forecaster
-                    self.holder.set(fnew)  # 原子替换
-                    self.guard.mark_loaded()
-                    self.on_log("[RELOAD] 热更新完成。")
+                    self._reload()
+            except Exception as e:
+                self.on_log(f"[WARN] 热更新失败，保持旧模型：{e!r}")
+
+    def _run_watch(self):
+        watched = {os.path.abspath(p) for p in self.guard.paths.values()}
+        handler = _ModelFileHandler(watched, self._schedule_check)
+        observer = Observer()
+        for d in {os.path.dirname(p) for p in watched}:
+            observer.schedule(handler, d, recursive=False)
+        observer.start()
+        try:
+            self.stop_evt.wait()
+        finally:
+            observer.stop()
+            observer.join()
+            if self._timer is not None:
+                self._timer.cancel()
+
+    def _schedule_check(self):
+        # 每来一个事件就重置计时：文件静默 debounce 秒后才检查，等同于去抖
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.guard.debounce, self._check_after_quiet)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _check_after_quiet(self):
+        with self._reload_lock:
+            try:
+                if not self.stop_evt.is_set() and self.guard.changed():
+                    self._reload()
             except Exception as e:
                 self.on_log(f"[WARN] 热更新失败，保持旧模型：{e!r}")
 
+class TailCache:
+    """
+    增量读取持续追加的 CSV，只保留 header + 最后 n 行，避免每回合整表 read_csv。
+    记录 (inode, 已消费字节偏移)；下次只 pread 偏移之后的新字节。
+    文件被替换（inode 变）、截断或改写（偏移前一字节不是换行）时从头重读。
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._ino = None
+        self._offset = 0
+        self._header = b""
+        self._lines: deque = deque(maxlen=0)
+
+    def _reset(self, ino: int, n: int):
+        self._ino = ino
+        self._offset = 0
+        self._header = b""
+        self._lines = deque(maxlen=n)
+
+    def tail(self, n: int) -> pd.DataFrame:
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            st = os.fstat(fd)
+            if (st.st_ino != self._ino or st.st_size < self._offset or n > self._lines.maxlen
+                    or (self._offset and os.pread(fd, 1, self._offset - 1) != b"\n")):
+                self._reset(st.st_ino, n)
+            if st.st_size > self._offset:
+                chunk = os.pread(fd, st.st_size - self._offset, self._offset)
+                end = chunk.rfind(b"\n") + 1   # 只消费完整行，写了一半的行留到下次
+                lines = chunk[:end].splitlines(keepends=True)
+                if self._offset == 0 and lines:
+                    self._header = lines.pop(0)
+                self._lines.extend(lines)
+                self._offset += end
+        finally:
+            os.close(fd)
+        return pd.read_csv(io.BytesIO(self._header + b"".join(self._lines)))
+
+
 class Domain:
     def __init__(self, domain_id: str, address: str, nodes: int,
                  read_requests: float = 0.0, write_requests: float = 0.0):
@@ -143,6 +303,18 @@ class Domain:
 
 
 class OptimalLeaderCalculator:
+    # 每台机器上的 etcd 成员 ID，按 client 端口 2379 / 3379 / 4379 的顺序排列
+    ip_groups = {
+        "192.168.0.38": ["933ca51d2bb602b8", "6181f76d6668aeb0", "69948e3d245f62b7"],
+        "192.168.0.82": ["b92b49a4de72942d", "3cdaf029c87a002", "5b3ba363fb10d52f"],
+        "192.168.0.223": ["69f554c3f7f50a72", "8861d1f6a0217629", "512e070e8eb32959"]
+    }
+    # 由 ip_groups 派生，类级共享、只读
+    IpToId = {f"{ip}:{port}": nid
+              for ip, nids in ip_groups.items()
+              for port, nid in zip((2379, 3379, 4379), nids)}
+    node_id_to_ip = {nid: ip for ip, nids in ip_groups.items() for nid in nids}
+
     def __init__(self):
         # IP 映射
         self.ip_to_index = {
@@ -158,36 +330,71 @@ class OptimalLeaderCalculator:
             [30, 0, 50],   # from 192.168.0.82
             [40, 50, 0]    # from 192.168.0.223
         ]
+        # RTT 矩阵的 NumPy 副本，find_optimal_leader 向量化打分用
+        self.latency_np = np.asarray(self.latency_matrix, dtype=np.int32)
 
-        self.ip_groups = {
-            "192.168.0.38": ["933ca51d2bb602b8", "6181f76d6668aeb0", "69948e3d245f62b7"],
-            "192.168.0.82": ["b92b49a4de72942d", "3cdaf029c87a002", "5b3ba363fb10d52f"],
-            "192.168.0.223": ["69f554c3f7f50a72", "8861d1f6a0217629", "512e070e8eb32959"]
-        }
+        # move-leader 耗时日志的常驻 fd（首次迁移时懒打开）
+        self._move_log_fd: Optional[int] = None
 
-        self.IpToId = {
-            '192.168.0.38:2379': '933ca51d2bb602b8',
-            '192.168.0.38:3379': '6181f76d6668aeb0',
-            '192.168.0.38:4379': '69948e3d245f62b7',
-            '192.168.0.82:2379': 'b92b49a4de72942d',
-            '192.168.0.82:3379': '3cdaf029c87a002',
-            '192.168.0.82:4379': '5b3ba363fb10d52f',
-            '192.168.0.223:2379': '69f554c3f7f50a72',
-            '192.168.0.223:3379': '8861d1f6a0217629',
-            '192.168.0.223:4379': '512e070e8eb32959'
-        }
+        # 预测列布局缓存：(列名元组, node_ids, write 列下标, read 列下标)
+        self._pred_layout = None
 
-        self.node_id_to_ip = {
-            '933ca51d2bb602b8': '192.168.0.38',
-            '6181f76d6668aeb0': '192.168.0.38',
-            '69948e3d245f62b7': '192.168.0.38',
-            'b92b49a4de72942d': '192.168.0.82',
-            '3cdaf029c87a002': '192.168.0.82',
-            '5b3ba363fb10d52f': '192.168.0.82',
-            '69f554c3f7f50a72': '192.168.0.223',
-            '8861d1f6a0217629': '192.168.0.223',
-            '512e070e8eb32959': '192.168.0.223'
-        }
+    def _pred_column_layout(self, columns):
+        """
+        从列名抽取节点 id 及其 *_write / *_read 列下标。
+        模型特征列跨回合不变，按列名元组缓存，命中时跳过解析。
+        缺失的列记为 -1，对应 means 末尾补上的 0.0；ip_pos 为节点 IP 在延迟矩阵中的下标（未知为 -1）。
+        """
+        key = tuple(columns)
+        if self._pred_layout is None or self._pred_layout[0] != key:
+            write_idx = {c[:-6]: i for i, c in enumerate(key) if c.endswith("_write")}
+            read_idx  = {c[:-5]: i for i, c in enumerate(key) if c.endswith("_read")}
+            node_ids = sorted(write_idx.keys() | read_idx.keys())
+            w_pos = np.array([write_idx.get(n, -1) for n in node_ids], dtype=np.intp)
+            r_pos = np.array([read_idx.get(n, -1) for n in node_ids], dtype=np.intp)
+            ip_pos = np.array([self.ip_to_index.get(self.node_id_to_ip.get(n), -1) for n in node_ids],
+                              dtype=np.intp)
+            self._pred_layout = (key, node_ids, w_pos, r_pos, ip_pos)
+        return self._pred_layout[1:]
+
+    def _pred_active(self, pred_df: pd.DataFrame):
+        """
+        预测均值 + 有效节点筛选（两条打分路径共用）：
+        对 horizon 维度求均值（一次 FP32 NumPy 归约），保留读写不全为 0 且 IP 已知的节点。
+        返回 (node_ids, read_vals, write_vals, ip_pos, sel)，sel 为有效节点下标。
+        """
+        # 期望列命名形如：{node_id}_write  与  {node_id}_read
+        node_ids, w_pos, r_pos, ip_pos = self._pred_column_layout(pred_df.columns)
+        # 末尾补 0.0 给缺失列
+        means = np.append(pred_df.to_numpy(dtype=np.float32, copy=False).mean(axis=0), 0.0)
+        write_vals = means[w_pos]
+        read_vals  = means[r_pos]
+
+        active = (write_vals != 0.0) | (read_vals != 0.0)
+        unknown = active & (ip_pos < 0)
+        if unknown.any():
+            for i in np.flatnonzero(unknown):
+                log.warning("警告: 节点 %s 的IP地址未知，跳过", node_ids[i])
+            active &= ~unknown
+        return node_ids, read_vals, write_vals, ip_pos, np.flatnonzero(active)
+
+    def _score(self, req: np.ndarray, idx: np.ndarray, labels) -> np.ndarray:
+        """
+        所有候选一次算完：T(p) = Σ int((R_i + W_i) * L(p, i))。
+        idx 为各域 IP 在延迟矩阵中的下标（未知为 -1，延迟记 999）；领导者自身延迟为 0。
+        """
+        lat_sub = self.latency_np[np.ix_(idx, idx)]
+        unknown = idx < 0
+        if unknown.any():
+            lat_sub[unknown, :] = 999
+            lat_sub[:, unknown] = 999
+        np.fill_diagonal(lat_sub, 0)
+        costs = (lat_sub * req).astype(np.int64).sum(axis=1)
+
+        if log.isEnabledFor(logging.DEBUG):
+            for p, label in enumerate(labels):
+                log.debug("候选领导者 %s: 总请求=%.3f, T=%dms", label, req[p], costs[p])
+        return costs
 
     # === 新增：用预测均值来构造 domains ===
     def build_domains_from_pred_mean(self, pred_df: pd.DataFrame) -> List[Domain]:
@@ -197,77 +404,46 @@ class OptimalLeaderCalculator:
         输出：Domain 列表
         """
         if pred_df is None or pred_df.empty:
-            print("预测结果为空")
+            log.warning("预测结果为空")
             return []
-
-        # 对 horizon 维度求均值（得到一行）
-        mean_row = pred_df.mean(axis=0)  # Series, index=列名
-
-        # 从列名自动抽取节点 id
-        # 期望列命名形如：{node_id}_write  与  {node_id}_read
-        node_ids = set()
-        for col in mean_row.index:
-            if col.endswith("_write"):
-                node_ids.add(col[:-6])
-            elif col.endswith("_read"):
-                node_ids.add(col[:-5])
-
-        domains: List[Domain] = []
-        for node_id in sorted(node_ids):
-            write_col = f"{node_id}_write"
-            read_col  = f"{node_id}_read"
-            write_val = float(mean_row.get(write_col, 0.0))
-            read_val  = float(mean_row.get(read_col, 0.0))
-
-            if write_val == 0.0 and read_val == 0.0:
-                continue
-
-            ip_addr = self.node_id_to_ip.get(node_id, "unknown")
-            if ip_addr == "unknown":
-                print(f"警告: 节点 {node_id} 的IP地址未知，跳过")
-                continue
-
-            domains.append(Domain(node_id, ip_addr, nodes=1,
-                                  read_requests=read_val, write_requests=write_val))
-            print(f"预测均值域: {node_id[:8]}..., ip={ip_addr}, read(mean)={read_val:.3f}, write(mean)={write_val:.3f}")
-        return domains
-
-    def get_latency(self, from_ip: str, to_ip: str) -> int:
-        if from_ip not in self.ip_to_index or to_ip not in self.ip_to_index:
-            print(f"警告: 未知的IP地址 {from_ip} 或 {to_ip}")
-            return 999
-        return self.latency_matrix[self.ip_to_index[from_ip]][self.ip_to_index[to_ip]]
-
-    def calculate_total_latency(self, leader_domain: Domain, domains: List[Domain]) -> int:
-        leader_ip = leader_domain.address
-        total_latency = 0
-        for domain in domains:
-            latency = 0 if domain.id == leader_domain.id else self.get_latency(leader_ip, domain.address)
-            total_req = domain.read_requests + domain.write_requests
-            total_latency += int(total_req * latency)
-            print(f"  域 {domain.id}: 总请求={total_req:.3f}, 延迟={latency}ms, 域延迟={int(total_req * latency)}ms")
-        print(f"总加权延迟 T({leader_domain.id}) = {total_latency}ms")
-        return total_latency
+        node_ids, read_vals, write_vals, ip_pos, sel = self._pred_active(pred_df)
+        return [Domain(node_ids[i], self.index_to_ip[ip_pos[i]], nodes=1,
+                       read_requests=float(read_vals[i]), write_requests=float(write_vals[i]))
+                for i in sel]
 
     def find_optimal_leader(self, domains: List[Domain]):
         if not domains:
-            print("没有可用的域")
+            log.warning("没有可用的域")
+            return None, None
+        req = np.array([d.read_requests + d.write_requests for d in domains], dtype=np.float64)
+        idx = np.array([self.ip_to_index.get(d.address, -1) for d in domains], dtype=np.intp)
+        if (idx < 0).any():
+            log.warning("警告: 未知的IP地址 %s", [d.address for d, i in zip(domains, idx) if i < 0])
+        costs = self._score(req, idx, [d.id for d in domains])
+        best = int(costs.argmin())   # 并列时取第一个，与逐个比较 `<` 一致
+        return domains[best], int(costs[best])
+
+    def decide_optimal(self, pred_df: pd.DataFrame):
+        """
+        build_domains_from_pred_mean + find_optimal_leader 的融合版：
+        直接从预测 DataFrame 算出 (最优领导者 IP, 总加权延迟)，不构造 Domain。
+        结果（含并列取第一个）与两步调用一致；无可用节点时返回 (None, None)。
+        """
+        if pred_df is None or pred_df.empty:
+            log.warning("预测结果为空")
             return None, None
-        total_nodes = sum(d.nodes for d in domains)
-        quorum_size = math.floor(total_nodes / 2) + 1
-        print(f"总节点数: {total_nodes}，法定人数: {quorum_size}，域数量: {len(domains)}")
-        print("=" * 50)
-
-        best, best_cost = None, float("inf")
-        for cand in domains:
-            print(f"评估候选领导者 {cand.id} (IP: {cand.address}) ...")
-            cost = self.calculate_total_latency(cand, domains)
-            print("-" * 30)
-            if cost < best_cost:
-                best, best_cost = cand, cost
-        return best, best_cost
-
-    def scp_to_host(self, local_file, host, remote_path, user="root", port=22, key=None):
+
+        node_ids, read_vals, write_vals, ip_pos, sel = self._pred_active(pred_df)
+        if sel.size == 0:
+            log.warning("没有可用的域")
+            return None, None
+
+        idx = ip_pos[sel]
+        costs = self._score(write_vals[sel] + read_vals[sel], idx, [node_ids[i] for i in sel])
+        best = int(costs.argmin())
+        return self.index_to_ip[idx[best]], int(costs[best])
+
+    async def scp_to_host(self, local_file, host, remote_path, user="root", port=22, key=None):
         if not os.path.exists(local_file):
             raise FileNotFoundError(f"本地文件不存在: {local_file}")
         scp_cmd = ["scp"]
@@ -276,17 +452,27 @@ class OptimalLeaderCalculator:
         if port and port != 22:
             scp_cmd += ["-P", str(port)]
         scp_cmd += [local_file, f"{user}@{host}:{remote_path}"]
-        print("执行文件传输命令：", " ".join(scp_cmd))
-        subprocess.run(scp_cmd, check=True)
-        print(f"文件已传到 {host}:{remote_path}")
+        log.info("执行文件传输命令：%s", " ".join(scp_cmd))
+        proc = await asyncio.create_subprocess_exec(*scp_cmd)
+        if await proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, scp_cmd)
+        log.info("文件已传到 %s:%s", host, remote_path)
 
-    def check_and_transfer_leader(self, current_leader_ip: str, optimal_leader_ip: str):
+    async def check_and_transfer_leader(self, current_leader_ip: str, optimal_leader_ip: str, flush=None):
+        """
+        scp 状态文件到目标节点后执行 move-leader。
+        flush: 可选的同步落盘回调（如 logger.flush_remaining），放到线程里与 scp 并发执行。
+        """
         local_path = "/etcd/etcd-release-3.4/raft_stats.csv"
         remote_path = "/etcd/etcd-release-3.4/raft_stats.csv"
 
 
         endpoint = optimal_leader_ip + ":2379"
-        self.scp_to_host(local_path, optimal_leader_ip, remote_path)
+        if flush is not None:
+            await asyncio.gather(self.scp_to_host(local_path, optimal_leader_ip, remote_path),
+                                 asyncio.to_thread(flush))
+        else:
+            await self.scp_to_host(local_path, optimal_leader_ip, remote_path)
 
         current_leader_url = current_leader_ip + ":2379"
 
@@ -297,45 +483,33 @@ class OptimalLeaderCalculator:
             self.IpToId.get(endpoint, "unknown")
         ]
 
-        print("执行命令:", " ".join(cmd))
+        log.info("执行命令: %s", " ".join(cmd))
 
         # subprocess.run(cmd, check=True)
-        self.move_leader_with_timing(cmd)
-        print("success")
+        await self.move_leader_with_timing(cmd)
+        log.info("success")
         
         os.remove(local_path)
-        print(f"已删除本地文件 {local_path}")
+        log.info("已删除本地文件 %s", local_path)
         return 1
         
-    def move_leader_with_timing(self, cmd, csv_path="/etcd/etcd-release-3.4/move_leader_timeC.csv"):
+    async def move_leader_with_timing(self, cmd, csv_path="/etcd/etcd-release-3.4/move_leader_timeC.csv"):
         # 记录起始时间
         t_start = time.time()
-        try:
-            subprocess.run(cmd, check=True)
-            status = "success"
-        except subprocess.CalledProcessError:
-            status = "failed"
+        proc = await asyncio.create_subprocess_exec(*cmd)
+        status = "success" if await proc.wait() == 0 else "failed"
         t_end = time.time()
 
         # 计算耗时（毫秒）
         elapsed_ms = (t_end - t_start) * 1000
 
         # 当前时间（精确到分钟）
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
-
-        # 写入 CSV
-        row = {
-            "timestamp": timestamp,
-            "status": status,
-            "elapsed_ms": f"{elapsed_ms:.2f}"
-        }
+        timestamp = _now_minute_str()
 
-        file_exists = os.path.exists(csv_path)
-        with open(csv_path, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=row.keys())
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(row)
+        # 写入 CSV：整行格式化后一次 os.write
+        if self._move_log_fd is None:
+            self._move_log_fd = _open_append_fd(csv_path, "timestamp,status,elapsed_ms")
+        os.write(self._move_log_fd, f"{timestamp},{status},{elapsed_ms:.2f}\r\n".encode())
 
         return elapsed_ms
 HISTORY_CSV = "/etcd/etcd-release-3.4/raft_stats.csv"
@@ -357,7 +531,9 @@ PREDICT_LOG_CSV = "/etcd/etcd-release-3.4/predicted_leaderC.csv"
 METRICS_CSV     = "/etcd/etcd-release-3.4/leader_move_metricsC.csv"
 
 
+@functools.lru_cache(maxsize=1)
 def get_current_leader_ip():
+    """本机出口 IP；进程内不会变，首次成功后缓存。"""
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
         s.connect(("8.8.8.8", 80))
@@ -368,50 +544,54 @@ def get_current_leader_ip():
 
 
 # ========= 主逻辑 =========
-def run_once_and_decide(forecaster: Forecaster, calc: OptimalLeaderCalculator, self_ip: str) -> tuple[bool, Optional[str]]:
+def run_once_and_decide(forecaster: Forecaster, calc: OptimalLeaderCalculator, self_ip: str,
+                        history: Optional[TailCache] = None) -> tuple[bool, Optional[str]]:
     """
     执行一次：预测 -> 取均值 -> 计算最优领导者
+    history: 若给出，只把 HISTORY_CSV 的尾部若干行交给预测器（不再整表解析）
     返回：(is_self_optimal, optimal_ip or None)
     """
+    if history is not None:
+        data = history.tail(max(USE_LAST_ROWS, forecaster.look_back))
+    else:
+        data = HISTORY_CSV
+
     # 预测未来 horizon 行（DataFrame；列名与训练时一致）
     pred_df: pd.DataFrame = forecaster.predict(
-        data=HISTORY_CSV,
+        data=data,
         use_last_rows=USE_LAST_ROWS,
         fixed_step_sec=FIXED_STEP_SEC,
-        return_dataframe=True
+        return_dataframe=True,
+        dtype=np.float32,
     )
 
     if pred_df is None or pred_df.empty:
-        print("[WARN] 预测结果为空，默认认为保持当前领导者")
-        return True, None
-
-    # 用“未来窗口均值”构造域（你类里已有该方法，接受 DataFrame）
-    domains = calc.build_domains_from_pred_mean(pred_df)
-    if not domains:
-        print("[WARN] 无法从预测构造域，默认保持当前领导者")
+        log.warning("[WARN] 预测结果为空，默认认为保持当前领导者")
         return True, None
 
-    # 计算最优领导者
-    optimal, _ = calc.find_optimal_leader(domains)
-    if not optimal:
-        print("[WAR] 未能选出最优领导者，默认保持当前领导者")
+    # 用“未来窗口均值”一次算出最优领导者
+    optimal_ip, _ = calc.decide_optimal(pred_df)
+    if not optimal_ip:
+        log.warning("[WARN] 未能选出最优领导者，默认保持当前领导者")
         return True, None
 
-    optimal_ip = optimal.address
     is_self = (optimal_ip == self_ip)
-    print(f"[INFO] 本机={self_ip}，最优领导者={optimal_ip} -> {'保持' if is_self else '需要迁移'}")
+    log.debug("[INFO] 本机=%s，最优领导者=%s -> %s", self_ip, optimal_ip, "保持" if is_self else "需要迁移")
     return is_self, optimal_ip
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
     start_time=time.time()
-    print("[BOOT] 启动 predict_leader（无命令行参数版）")
-    print(f"[CONF] HISTORY_CSV={HISTORY_CSV}")
-    print(f"[CONF] MODEL={MODEL_PATH}")
-    print(f"[CONF] SCALER={SCALER_PATH}")
-    print(f"[CONF] META={META_PATH}")
-    print(f"[CONF] USE_LAST_ROWS={USE_LAST_ROWS}, FIXED_STEP_SEC={FIXED_STEP_SEC}, INTERVAL_SEC={INTERVAL_SEC}, MAX_ITERS={MAX_ITERS}")
+    log.info("[BOOT] 启动 predict_leader（无命令行参数版）")
+    log.info("[CONF] HISTORY_CSV=%s", HISTORY_CSV)
+    log.info("[CONF] MODEL=%s", MODEL_PATH)
+    log.info("[CONF] SCALER=%s", SCALER_PATH)
+    log.info("[CONF] META=%s", META_PATH)
+    log.info("[CONF] USE_LAST_ROWS=%s, FIXED_STEP_SEC=%s, INTERVAL_SEC=%s, MAX_ITERS=%s", USE_LAST_ROWS, FIXED_STEP_SEC, INTERVAL_SEC, MAX_ITERS)
 
     logger = BufferedPredictedLeaderWriter(PREDICT_LOG_CSV)
+    # kill(SIGTERM) 时走 SystemExit → finally，保证预测日志落盘
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
     # === METRICS: 活动时长与预测次数（不含 sleep）===
     from time import perf_counter
@@ -424,7 +604,7 @@ def main():
     while forecaster is None:
         try:
             forecaster = Forecaster(MODEL_PATH, SCALER_PATH, META_PATH)
-            print("[BOOT] 预测器初始化成功")
+            log.info("[BOOT] 预测器初始化成功")
 
             f_holder = ForecasterHolder(forecaster)
 
@@ -435,18 +615,19 @@ def main():
                 holder=f_holder,
                 model_path=MODEL_PATH, scaler_path=SCALER_PATH, meta_path=META_PATH,
                 interval_sec=15, debounce_sec=5, use_hash=False,
-                forecaster_ctor=_make_forecaster, on_log=print
+                forecaster_ctor=_make_forecaster, on_log=log.info
             )
             reload_worker.start()
         except Exception as e:
-            print(f"[ERROR] 预测器初始化失败: {e!r}，30s 后重试...")
+            log.error("[ERROR] 预测器初始化失败: %r，30s 后重试...", e)
             time.sleep(30)
 
     calc = OptimalLeaderCalculator()
+    history = TailCache(HISTORY_CSV)
 
     # 本机 IP
     self_ip = get_current_leader_ip()
-    print(f"[BOOT] 本机IP: {self_ip}")
+    log.info("[BOOT] 本机IP: %s", self_ip)
     
     time.sleep(SLEEP_SEC)
 
@@ -454,61 +635,62 @@ def main():
     try: 
         while True:
             it += 1
-            print(f"\n===== 回合 #{it} =====")
+            log.debug("===== 回合 #%d =====", it)
 
             try:
                 cur_f = f_holder.get()
 
                 # === METRICS: 预测/决策计时（不含 sleep）===
                 t0 = perf_counter()
-                is_self, optimal_ip = run_once_and_decide(cur_f, calc, self_ip)
+                is_self, optimal_ip = run_once_and_decide(cur_f, calc, self_ip, history)
                 t1 = perf_counter()
                 pred_active_sec += (t1 - t0)
                 rounds += 1
 
             except Exception as e:
                 # 兜底：即使某轮预测/构造失败，也不要 crash，按保持自己处理
-                print(f"[ERROR] 本轮预测/决策异常：{e!r}，默认保持当前领导者")
+                log.error("[ERROR] 本轮预测/决策异常：%r，默认保持当前领导者", e)
                 is_self, optimal_ip = True, None
 	    
             will_move = not is_self
 
             if will_move and not optimal_ip:
-                print("[WARN] 需要迁移但 optimal_ip 为空，降级为保持当前领导者。")
+                log.warning("[WARN] 需要迁移但 optimal_ip 为空，降级为保持当前领导者。")
                 will_move = False
 
             leader_for_log = self_ip if not will_move else optimal_ip
-            logger.record(leader_for_log, will_move)
+            # 迁移时的落盘由 check_and_transfer_leader 负责（flush_remaining 与 scp 并发），这里不重复 flush
+            logger.record(leader_for_log, will_move=will_move, flush=False)
 
 
             # 5) 根据决策执行/等待
             if not will_move:
                 # 仍为最优领导者，可能迭代退出或继续睡眠
                 if MAX_ITERS > 0 and it >= MAX_ITERS:
-                    print("[EXIT] 达到最大轮次限制，退出。")
+                    log.info("[EXIT] 达到最大轮次限制，退出。")
                     break
-                print(f"[KEEP] predicted {self_ip}, {INTERVAL_SEC}s 后再次评估...")
+                log.debug("[KEEP] predicted %s, %ss 后再次评估...", self_ip, INTERVAL_SEC)
                 time.sleep(INTERVAL_SEC)
                 continue
 
             # 6) 需要迁移（will_move=True 且 optimal_ip 非空）——执行一次并退出
-            print(f"[ACTION] 触发领导者迁移: {self_ip} -> {optimal_ip}")
+            log.info("[ACTION] 触发领导者迁移: %s -> %s", self_ip, optimal_ip)
 
             # === METRICS: 迁移动作计时 ===
             mv0 = perf_counter()
-            ok = calc.check_and_transfer_leader(self_ip, optimal_ip)
+            ok = asyncio.run(calc.check_and_transfer_leader(self_ip, optimal_ip, flush=logger.flush_remaining))
             mv1 = perf_counter()
             move_sec = (mv1 - mv0)
 
             if ok:
-                print(f"[DONE] 迁移完成，leader -> {optimal_ip}")
+                log.info("[DONE] 迁移完成，leader -> %s", optimal_ip)
             else:
-                print("[ERROR] 迁移失败，退出程序（避免重复操作）。")
+                log.error("[ERROR] 迁移失败，退出程序（避免重复操作）。")
 
             # === METRICS: 汇总并写入 CSV ===
             total_active_ms = (pred_active_sec + move_sec) * 1000.0
             row = {
-                "ts": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                "ts": _now_minute_str(),
                 "rounds": rounds,
                 "pred_active_ms": f"{pred_active_sec * 1000.0:.2f}",
                 "move_ms": f"{move_sec * 1000.0:.2f}",
@@ -516,9 +698,9 @@ def main():
             }
             try:
                 _append_metrics_row(METRICS_CSV, row)
-                print(f"[METRICS] 写入 {METRICS_CSV}: {row}")
+                log.info("[METRICS] 写入 %s: %s", METRICS_CSV, row)
             except Exception as e:
-                print(f"[WARN] 指标写入失败: {e!r}")
+                log.warning("[WARN] 指标写入失败: %r", e)
 
             break
 
@@ -529,32 +711,43 @@ def main():
             reload_worker.stop()
         except Exception:
             pass
+        logger.close()
 
 
     time_end=time.time()
-    print(f"[TIMER] 程序总耗时: {time_end - start_time:.2f} 秒")
+    log.info("[TIMER] 程序总耗时: %.2f 秒", time_end - start_time)
+
+def _open_append_fd(csv_path: str, header: str) -> int:
+    """以 O_APPEND 打开 CSV 并返回常驻 fd；文件为空时先写 header。行尾沿用 csv.writer 的 \\r\\n。"""
+    fd = os.open(csv_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+    if os.fstat(fd).st_size == 0:
+        os.write(fd, (header + "\r\n").encode())
+    return fd
+
+_ts_minute_cache = [0, ""]   # [epoch 分钟数, 对应的 "%Y-%m-%d %H:%M" 字符串]
+
+def _now_minute_str() -> str:
+    """当前本地时间（精确到分钟）；同一分钟内直接复用上次格式化的结果。"""
+    t = int(time.time() // 60)
+    if t != _ts_minute_cache[0]:
+        _ts_minute_cache[:] = [t, datetime.fromtimestamp(t * 60).strftime("%Y-%m-%d %H:%M")]
+    return _ts_minute_cache[1]
+
+_metrics_fd: Optional[int] = None   # METRICS_CSV 的常驻 fd（懒打开，进程生命周期内复用）
 
 def _append_metrics_row(csv_path: str, row: dict):
     """将一次运行的统计指标写入 CSV（若不存在则写 header）。"""
-    header = [
-        "ts",                 # 记录时间（到分钟）
-        "rounds",             # 评估轮数
-        "pred_active_ms",     # 迁移前：纯计算累计时长（不含 sleep、不含迁移）
-        "move_ms",            # move-leader 执行时长
-        "total_active_ms"     # 总活动时长 = pred_active_ms + move_ms
-    ]
-    need_header = False
-    try:
-        with open(csv_path, "r", newline="") as _:
-            pass
-    except FileNotFoundError:
-        need_header = True
-
-    with open(csv_path, "a", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=header)
-        if need_header:
-            w.writeheader()
-        w.writerow(row)
+    # 列顺序：
+    #   ts               记录时间（到分钟）
+    #   rounds           评估轮数
+    #   pred_active_ms   迁移前：纯计算累计时长（不含 sleep、不含迁移）
+    #   move_ms          move-leader 执行时长
+    #   total_active_ms  总活动时长 = pred_active_ms + move_ms
+    global _metrics_fd
+    if _metrics_fd is None:
+        _metrics_fd = _open_append_fd(csv_path, "ts,rounds,pred_active_ms,move_ms,total_active_ms")
+    line = f"{row['ts']},{row['rounds']},{row['pred_active_ms']},{row['move_ms']},{row['total_active_ms']}\r\n"
+    os.write(_metrics_fd, line.encode())
 
 
 if __name__ == "__main__":
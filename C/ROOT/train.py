@@ -10,14 +10,12 @@ from ts_common import (
     build_seq2seq_model, safe_inverse_transform
 )
 from sklearn.metrics import mean_squared_error
+import tensorflow as tf
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
 
 def run_train(args):
     set_seed(args.seed)
 
-    df = pd.read_csv(args.input)
-    df = ensure_timestamp(df, col="timestamp")
-
     # 只保留指定的 6 个节点列
     keep_cols = [
         "69f554c3f7f50a72_write", "69f554c3f7f50a72_read",
@@ -25,16 +23,33 @@ def run_train(args):
         "b92b49a4de72942d_write", "b92b49a4de72942d_read"
     ]
 
+    # 只解析需要的列；指定 tail-rows 时先数行，跳过前面用不到的数据行，不再整表解析
+    header = pd.read_csv(args.input, nrows=0).columns
+    skiprows = None
+    if args.tail_rows and args.tail_rows > 0:
+        with open(args.input, "rb") as f:
+            n_rows = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b"")) - 1
+        if n_rows > args.tail_rows:
+            skiprows = range(1, n_rows - args.tail_rows + 1)
+    df = pd.read_csv(
+        args.input,
+        usecols=[c for c in ["timestamp"] + keep_cols if c in header],
+        dtype={c: np.float32 for c in keep_cols if c in header},
+        skiprows=skiprows,
+        engine="c",
+    )
+    df = ensure_timestamp(df, col="timestamp")
+
     missing = [c for c in keep_cols if c not in df.columns]
     if missing:
         raise ValueError(f"缺少需要的列: {missing}")
 
-    df = df[keep_cols].dropna().astype("float32")
+    df = df[keep_cols].dropna()
 
         # === 仅使用最后 N 行（默认 1800） ===
     if args.tail_rows and args.tail_rows > 0:
-        if len(df) > args.tail_rows:
-            df = df.tail(args.tail_rows).copy()
+        if skiprows is not None or len(df) > args.tail_rows:
+            df = df.tail(args.tail_rows)
             print(f"[INFO] 使用 CSV 最后 {args.tail_rows} 行作为数据窗口（当前 df 行数={len(df)}）")
         else:
             print(f"[WARN] 数据行数({len(df)}) 少于 tail-rows({args.tail_rows})，将使用全部数据")
@@ -71,7 +86,8 @@ def run_train(args):
         cbs.append(ReduceLROnPlateau(monitor="val_loss", factor=0.5, patience=3, min_lr=1e-5))
 
     model.fit(
-        X_train, y_train,
+        # 滑窗视图到这里才物化成连续的 float32 数组
+        np.ascontiguousarray(X_train, dtype=np.float32), np.ascontiguousarray(y_train, dtype=np.float32),
         epochs=args.epochs,
         batch_size=args.batch_size,
         validation_split=args.val_split,
@@ -135,7 +151,29 @@ def run_train(args):
     scaler_path = os.path.join(args.out_dir, args.scaler_out)
     meta_path   = os.path.join(args.out_dir, args.meta_out)
 
+    # 额外导出 FP16 量化的 TFLite 模型供推理端优先加载。转换较慢，先在内存里做完，
+    # 再把 .h5 / .tflite / scaler / meta 紧挨着写出，避免 reloader 读到新模型配旧 scaler
+    tflite_path = model_path + ".fp16.tflite"
+    tflite_bytes = None
+    try:
+        conv = tf.lite.TFLiteConverter.from_keras_model(model)
+        conv.optimizations = [tf.lite.Optimize.DEFAULT]
+        conv.target_spec.supported_types = [tf.float16]
+        tflite_bytes = conv.convert()
+    except Exception as e:
+        print(f"[WARN] TFLite 导出失败，推理端将继续使用 Keras 模型: {e}")
+
     model.save(model_path)
+
+    # 在 .h5 之后写（推理端要求 tflite mtime >= h5 mtime）；先写临时文件再原子替换
+    if tflite_bytes is not None:
+        try:
+            with open(tflite_path + ".tmp", "wb") as f:
+                f.write(tflite_bytes)
+            os.replace(tflite_path + ".tmp", tflite_path)
+        except OSError as e:
+            print(f"[WARN] TFLite 写出失败，推理端将继续使用 Keras 模型: {e}")
+
     dump(scaler, scaler_path)
     with open(meta_path, "w", encoding="utf-8") as f:
         json.dump({"columns": feature_cols, "look_back": int(args.look_back), "horizon": int(args.horizon)}, f, ensure_ascii=False, indent=2)
@@ -4,6 +4,7 @@ warnings.filterwarnings("ignore")
 
 import numpy as np
 import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
 from joblib import dump, load as joblib_load
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics import mean_squared_error
@@ -28,15 +29,13 @@ def infer_step_delta(ts_index: pd.DatetimeIndex) -> pd.Timedelta:
     return diffs.median() if len(diffs) else pd.Timedelta(seconds=1)
 
 def create_dataset_multi(dataset: np.ndarray, look_back: int, horizon: int):
-    X, Y = [], []
-    limit = len(dataset) - look_back - horizon + 1
-    for i in range(limit):
-        X.append(dataset[i:i+look_back, :])
-        Y.append(dataset[i+look_back:i+look_back+horizon, :])
-    if not X:
+    if len(dataset) < look_back + horizon:
         f = dataset.shape[1]
         return np.empty((0, look_back, f)), np.empty((0, horizon, f))
-    return np.array(X), np.array(Y)
+    # 零拷贝滑窗视图：(样本数, look_back + horizon, 特征数)
+    # 返回的 X/Y 都是只读视图，需要连续内存时由调用方（如 model.fit 前）再物化
+    windows = sliding_window_view(dataset, look_back + horizon, axis=0).transpose(0, 2, 1)
+    return windows[:, :look_back, :], windows[:, look_back:, :]
 
 def build_seq2seq_model(n_features: int, look_back: int, horizon: int, units: int = 64) -> Sequential:
     model = Sequential([
@@ -1,10 +1,38 @@
 #!/usr/bin/env python3
 import os
+import gzip
+import shutil
+import argparse
+import asyncio
+import fcntl
+import struct
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import subprocess
+import shlex
 import socket
 import time
-
-IpToId = {
+import types
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:  # 未安装 orjson：退回标准库 json
+    import json
+    _loads = json.loads
+
+try:
+    import grpc
+    import etcd3
+except ImportError:  # 未安装 python-etcd3：get_leader / move-leader 仍走 etcdctl 子进程
+    etcd3 = None
+
+try:
+    import asyncssh
+except ImportError:  # 未安装 asyncssh：scp_to_host 只用 scp 子进程
+    asyncssh = None
+
+IpToId = types.MappingProxyType({
  '192.168.0.38:2379': '933ca51d2bb602b8',
  '192.168.0.38:3379': '6181f76d6668aeb0',
  '192.168.0.38:4379': '69948e3d245f62b7',
@@ -14,30 +42,135 @@ IpToId = {
  '192.168.0.223:2379': '69f554c3f7f50a72',
  '192.168.0.223:3379': '8861d1f6a0217629',
  '192.168.0.223:4379': '512e070e8eb32959'
-}
-
-ip_group =[]
-
-
-
-
+})
+# 以下均由 IpToId 派生，导入时算好、只读
+IdToIp = types.MappingProxyType({v: k for k, v in IpToId.items()})
+ip_group = tuple(IpToId)
+# URL → endpoint / 裸 IP，导入时算好；未知 URL 查不到，而不是切出一个错的 IP
+EP_TO_IP = types.MappingProxyType({ep: ep.split(":")[0] for ep in ip_group})
+URL_TO_EP = types.MappingProxyType({f"http://{ep}": ep for ep in ip_group})
+IP_FROM_URL = types.MappingProxyType({url: EP_TO_IP[ep] for url, ep in URL_TO_EP.items()})
+CLUSTER_IPS = frozenset(EP_TO_IP.values())
+# 轮换环：每台主机的 2379 成员；HOST_IDX 以裸 IP 为键，任意端口的 leader 都能 O(1) 定位
+TARGETS = tuple(ep for ep in ip_group if ep.endswith(":2379"))
+HOST_IDX = types.MappingProxyType({EP_TO_IP[ep]: i for i, ep in enumerate(TARGETS)})
+# 固定迁移目标（当前实验用）；设为 None 则按 TARGETS 环轮换
+FIXED_TARGET = "192.168.0.38:2379"
 
 # ------------------------------
 # 配置
 # ------------------------------
-ETCDCTL = "./bin/etcdctl"
-ENDPOINTS = (
-    "http://192.168.0.38:2379,http://192.168.0.38:3379,http://192.168.0.38:4379,"
-    "http://192.168.0.82:2379,http://192.168.0.82:3379,http://192.168.0.82:4379,"
-    "http://192.168.0.223:2379,http://192.168.0.223:3379,http://192.168.0.223:4379"
-)
+# 导入时解析成绝对路径：既不依赖启动目录，也省掉每次 exec 的相对路径解析
+ETCDCTL = os.environ.get("ETCDCTL") or os.path.join(
+    os.path.dirname(os.path.realpath(__file__)), "bin", "etcdctl")
+if not os.access(ETCDCTL, os.X_OK):
+    ETCDCTL = shutil.which("etcdctl") or ETCDCTL
+ETCDCTL = os.path.realpath(ETCDCTL)
+# 可执行文件给绝对路径 + close_fds=False，CPython 才会走 posix_spawn 而不是 fork+exec
+SCP = shutil.which("scp") or "scp"
+SSH = shutil.which("ssh") or "ssh"
+# 超过这个大小的 raft_stats.csv 先 gzip 再传；小文件压缩省下的字节抵不过多一次远端命令
+COMPRESS_MIN_BYTES = 4 << 20
+ENDPOINTS = ",".join(URL_TO_EP)
+
+# ssh 连接复用：首次 scp 自动成为 master，之后的 scp（包括本脚本下一次运行）
+# 直接走已有的控制套接字，省掉 TCP 握手 + 密钥交换
+SSH_OPTS = [
+    "-o", "ControlMaster=auto",
+    "-o", "ControlPath=/tmp/ssh-mux-%r@%h:%p",
+    "-o", "ControlPersist=600",
+    "-o", "Compression=no",
+    # AES-NI 加速的 GCM 优先；对端不支持时退到 ctr + etm MAC，而不是直接握手失败
+    "-o", "Ciphers=aes128-gcm@openssh.com,aes128-ctr",
+    "-o", "MACs=hmac-sha2-256-etm@openssh.com,hmac-sha2-256",
+    "-o", "IPQoS=throughput",
+]
+
+# SFTP 会话按 (host, user, port, key) 缓存；1 MiB 块 + 64 个并发 WRITE 请求
+_ssh_conns = {}
+_sftp_sessions = {}
+SFTP_BLOCK = 1 << 20
+SFTP_MAX_REQUESTS = 64
+
+async def _ssh_conn(host, user, port, key):
+    k = (host, user, port, key)
+    conn = _ssh_conns.get(k)
+    if conn is None:
+        conn = _ssh_conns[k] = await asyncssh.connect(host, port=port, username=user,
+                                                       client_keys=[key] if key else ())
+    return conn
+
+async def _sftp(host, user, port, key):
+    k = (host, user, port, key)
+    sftp = _sftp_sessions.get(k)
+    if sftp is None:
+        conn = await _ssh_conn(host, user, port, key)
+        sftp = _sftp_sessions[k] = await conn.start_sftp_client()
+    return sftp
+
+def _drop_ssh(host, user, port, key):
+    """出错后丢弃缓存的会话，并关掉它们，避免每次回退都泄漏一条连接"""
+    k = (host, user, port, key)
+    sftp = _sftp_sessions.pop(k, None)
+    if sftp is not None:
+        sftp.exit()
+    conn = _ssh_conns.pop(k, None)
+    if conn is not None:
+        conn.close()
+
+async def close_ssh():
+    """关闭所有缓存的 SFTP 会话与 ssh 连接（进程/事件循环退出前调用）"""
+    for sftp in _sftp_sessions.values():
+        sftp.exit()
+    _sftp_sessions.clear()
+    conns = list(_ssh_conns.values())
+    _ssh_conns.clear()
+    for conn in conns:
+        conn.close()
+    for conn in conns:
+        await conn.wait_closed()
+
+# gRPC 客户端按 endpoint 缓存，同一进程内只建一次 HTTP/2 连接
+_clients = {}
+STATUS_TIMEOUT = 3  # 秒；并发探测时挂掉的节点最多拖这么久
+
+def _etcd_client(endpoint):
+    c = _clients.get(endpoint)
+    if c is None:
+        host, port = endpoint.rsplit(":", 1)
+        c = _clients[endpoint] = etcd3.client(host=host, port=int(port))
+    return c
 
 # ------------------------------
-# 获取本机 IP (取第一块非 127.0.0.1 的地址)
+# 获取本机 IP (默认路由所在网卡的地址)
 # ------------------------------
+SIOCGIFADDR = 0x8915
+
+def _default_iface():
+    """从 /proc/net/route 找默认路由（Destination == 0）对应的网卡名"""
+    try:
+        with open("/proc/net/route") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if len(fields) > 1 and fields[1] == "00000000":
+                    return fields[0]
+    except OSError:
+        pass
+    return None
+
+@functools.lru_cache(maxsize=1)
 def get_local_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
+        iface = _default_iface()
+        if iface:
+            # 直接问内核这块网卡的地址，不产生任何网络操作
+            try:
+                req = struct.pack("256s", iface[:15].encode())
+                return socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, req)[20:24])
+            except OSError:
+                pass
         # 连接一个不存在的地址，只为获取本机IP
         s.connect(("8.8.8.8", 80))
         ip = s.getsockname()[0]
@@ -49,67 +182,77 @@ def get_local_ip():
 # 获取 Leader 地址 (http://ip:port)
 # ------------------------------
 def get_leader():
+    if etcd3 is not None:
+        # 任一存活节点的 Status 都带有当前 leader 的 member id：
+        # 并发问所有 endpoint，取最先返回的那个，耗时为 max(RTT) 而不是逐个重试
+        def status(ep):
+            return _etcd_client(ep).maintenancestub.Status(
+                etcd3.etcdrpc.StatusRequest(), STATUS_TIMEOUT)
+
+        ex = ThreadPoolExecutor(max_workers=len(ip_group))
+        try:
+            for fut in as_completed([ex.submit(status, ep) for ep in ip_group]):
+                try:
+                    st = fut.result()
+                except grpc.RpcError:
+                    continue
+                ep = IdToIp.get(f"{st.leader:x}")
+                return f"http://{ep}" if ep else None
+            return None
+        finally:
+            ex.shutdown(wait=False, cancel_futures=True)
+
     cmd = [
         ETCDCTL,
         f"--endpoints={ENDPOINTS}",
         "endpoint",
         "status",
-        "--write-out=table",
+        "--write-out=json",
     ]
-    output = subprocess.check_output(cmd, text=True)
-    for line in output.splitlines():
-        if "true" in line:  # 这一行包含 Leader
-            parts = line.split()
-            return parts[1]  # 第二列是 URL
+    output = subprocess.check_output(cmd, close_fds=False)
+    # leader 字段等于自身 member_id 的那个 endpoint 就是 Leader
+    for e in _loads(output):
+        st = e["Status"]
+        if st["leader"] == st["header"]["member_id"]:
+            return e["Endpoint"]
     return None
 
 # ------------------------------
 # 提取 Leader IP
 # ------------------------------
 def extract_ip(url: str):
-    if not url:
-        return None
-    return url.split("//")[1].split(":")[0]
-def moveleader_demo(local_ip, leader_url,
+    return IP_FROM_URL.get(url)
+async def moveleader_demo(local_ip, leader_url,
                     local_path="/etcd/etcd-release-3.4/raft_stats.csv",
                     remote_path="/etcd/etcd-release-3.4/raft_stats.csv"):
 
-    leader_endpoint = leader_url.split("://")[1]  # 例如 "192.168.0.38:2379"
-    target = None
-
-    if leader_endpoint != "192.168.0.38:2379":
-         target = "192.168.0.38:2379"
-
-    # 固定轮换逻辑
-    # if leader_endpoint == "192.168.0.38:2379":
-    #     target = "192.168.0.82:2379"
-    # elif leader_endpoint == "192.168.0.82:2379":
-    #     target = "192.168.0.223:2379"
-    # elif leader_endpoint == "192.168.0.223:2379":
-    #     target = "192.168.0.38:2379"
-    
-    # if leader_endpoint == "192.168.0.38:3379":
-    #     target = "192.168.0.82:2379"
-    # elif leader_endpoint == "192.168.0.82:3379":
-    #     target = "192.168.0.223:2379"
-    # elif leader_endpoint == "192.168.0.223:3379":
-    #     target = "192.168.0.38:2379"
-
-    # if leader_endpoint == "192.168.0.38:3379":
-    #     target = "192.168.0.82:2379"
-    # elif leader_endpoint == "192.168.0.82:3379":
-    #     target = "192.168.0.223:2379"
-    # elif leader_endpoint == "192.168.0.223:3379":
-    #     target = "192.168.0.38:2379"
+    leader_endpoint = URL_TO_EP[leader_url]  # 例如 "192.168.0.38:2379"
+    if FIXED_TARGET:
+        target = FIXED_TARGET if leader_endpoint != FIXED_TARGET else None
+    else:
+        # 按主机轮换：本机任一端口的成员是 leader → 转给环上下一台主机的 2379
+        i = HOST_IDX[IP_FROM_URL[leader_url]]
+        target = TARGETS[(i + 1) % len(TARGETS)]
 
     if not target:
         print("⚠️ 未找到匹配的目标节点")
         return
 
-    target_ip = target.split(":")[0]
-
-    # 先传文件
-    scp_to_host(local_path, target_ip, remote_path)
+    target_ip = EP_TO_IP[target]
+
+    # 先传文件：新 leader 上任后会往 raft_stats.csv 追加，必须在 move-leader 之前落地，
+    # 否则 scp 会覆盖掉新 leader 已写入的行
+    if os.path.getsize(local_path) >= COMPRESS_MIN_BYTES:
+        # 大文件压缩后再传，对端 gunzip -f 原地还原成 CSV（etcd 和预测脚本都只认 CSV）
+        gz_path = local_path + ".gz"
+        await asyncio.to_thread(_gzip_file, local_path, gz_path)
+        try:
+            await scp_to_host([(gz_path, remote_path + ".gz")], target_ip)
+        finally:
+            os.unlink(gz_path)
+        await ssh_run(target_ip, ["gunzip", "-f", remote_path + ".gz"])
+    else:
+        await scp_to_host([(local_path, remote_path)], target_ip)
 
     # 执行 etcdctl move-leader
     cmd = [
@@ -118,35 +261,107 @@ def moveleader_demo(local_ip, leader_url,
         "move-leader",
         IpToId[target]
     ]
-    print("执行命令:", " ".join(cmd))
-    subprocess.run(cmd, check=True)
-    print("✅ Leader 已转移到", target)
+    # 文件已传到目标节点：无论 move-leader 成败都删掉本地副本，避免下一轮传旧数据
+    try:
+        if etcd3 is not None:
+            print(f"执行 MoveLeader RPC: {leader_endpoint} -> {IpToId[target]}")
+            c = _etcd_client(leader_endpoint)
+            req = etcd3.etcdrpc.MoveLeaderRequest(targetID=int(IpToId[target], 16))
+            await asyncio.to_thread(c.maintenancestub.MoveLeader, req, c.timeout)
+        else:
+            print("执行命令:", " ".join(cmd))
+            proc = await asyncio.create_subprocess_exec(*cmd, close_fds=False)
+            if await proc.wait() != 0:
+                raise subprocess.CalledProcessError(proc.returncode, cmd)
+        print("✅ Leader 已转移到", target)
+    finally:
+        try:
+            os.unlink(local_path)
+            print(f"已删除本地文件 {local_path}")
+        except FileNotFoundError:
+            pass
 
-    # 删除本地文件
-    os.remove(local_path)
-    print(f"已删除本地文件 {local_path}")
 
+def _gzip_file(src, dst):
+    with open(src, "rb") as fsrc, gzip.open(dst, "wb", compresslevel=1) as fdst:
+        shutil.copyfileobj(fsrc, fdst, 1 << 20)
 
-def scp_to_host(local_file, host, remote_path, user="root", port=22, key=None, enable_log=True):
-    if not os.path.exists(local_file):
-        raise FileNotFoundError(f"本地文件不存在: {local_file}")
 
-    scp_cmd = ["scp"]
+async def ssh_run(host, cmd, user="root", port=22, key=None):
+    """在远端执行 argv 列表 cmd；优先复用 asyncssh 连接，否则走 ssh 子进程（同一 ControlMaster 通道）"""
+    # 远端由 shell 解析命令行，参数统一转义，路径里有空格/元字符也安全
+    remote = shlex.join(cmd)
+    ssh_cmd = [SSH, *SSH_OPTS, "-p", str(port)]
+    if key:
+        ssh_cmd += ["-i", key]
+    ssh_cmd += [f"{user}@{host}", remote]
+
+    if asyncssh is not None:
+        try:
+            conn = await _ssh_conn(host, user, port, key)
+            await conn.run(remote, check=True)
+            return
+        except asyncssh.ProcessError as e:
+            # 远端命令本身失败：连接是好的，不回退、不丢连接，按子进程失败上报
+            raise subprocess.CalledProcessError(e.exit_status, ssh_cmd, stderr=e.stderr) from e
+        except (asyncssh.Error, OSError) as e:  # 连接/传输层错误才回退到 ssh 子进程
+            _drop_ssh(host, user, port, key)
+            print(f"asyncssh 执行失败: {e}，改用 ssh")
+
+    proc = await asyncio.create_subprocess_exec(*ssh_cmd, close_fds=False)
+    if await proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, ssh_cmd)
+
+
+async def scp_to_host(files, host, user="root", port=22, key=None, enable_log=True):
+    """
+    files: [(本地路径, 远端路径), ...]
+    远端文件名与本地相同的按目标目录合并成一条 scp（一次握手传多个文件）；
+    需要改名的单独一条，但仍走同一个 ControlMaster 通道。
+    """
+    by_dir, renamed = {}, []
+    for local_file, remote_path in files:
+        if not os.path.exists(local_file):
+            raise FileNotFoundError(f"本地文件不存在: {local_file}")
+        if os.path.basename(remote_path) == os.path.basename(local_file):
+            by_dir.setdefault(os.path.dirname(remote_path) + "/", []).append(local_file)
+        else:
+            renamed.append((remote_path, [local_file]))
+
+    jobs = [*by_dir.items(), *renamed]
+
+    if asyncssh is not None:
+        t0 = time.perf_counter()
+        try:
+            sftp = await _sftp(host, user, port, key)
+            for dest, srcs in jobs:
+                await sftp.put(srcs if len(srcs) > 1 else srcs[0], dest,
+                               block_size=SFTP_BLOCK, max_requests=SFTP_MAX_REQUESTS)
+            duration = time.perf_counter() - t0
+            print(f"{len(files)} 个文件已经 SFTP 传到 {host} ，传输耗时：{duration*1000:.1f} ms ({duration:.6f} s)")
+            return duration
+        except (asyncssh.Error, OSError) as e:
+            _drop_ssh(host, user, port, key)
+            print(f"SFTP 传输失败: {e}，改用 scp")
+
+    base_cmd = [SCP, *SSH_OPTS]
     if key:
-        scp_cmd += ["-i", key]
+        base_cmd += ["-i", key]
     if port and port != 22:
-        scp_cmd += ["-P", str(port)]  # 注意：scp 用大写 P 指定端口
-    scp_cmd += [local_file, f"{user}@{host}:{remote_path}"]
-
-    print("执行文件传输命令：", " ".join(scp_cmd))
+        base_cmd += ["-P", str(port)]  # 注意：scp 用大写 P 指定端口
 
     # === 计时开始 ===
     t0 = time.perf_counter()
-    subprocess.run(scp_cmd, check=True)
+    for dest, srcs in jobs:
+        scp_cmd = [*base_cmd, *srcs, f"{user}@{host}:{dest}"]
+        print("执行文件传输命令：", " ".join(scp_cmd))
+        proc = await asyncio.create_subprocess_exec(*scp_cmd, close_fds=False)
+        if await proc.wait() != 0:
+            raise subprocess.CalledProcessError(proc.returncode, scp_cmd)
     duration = time.perf_counter() - t0
     # === 计时结束 ===
 
-    print(f"文件已传到 {host}:{remote_path} ，传输耗时：{duration*1000:.1f} ms ({duration:.6f} s)")
+    print(f"{len(files)} 个文件已传到 {host} ，传输耗时：{duration*1000:.1f} ms ({duration:.6f} s)")
 
     # 可选：记录到 CSV
     
@@ -156,12 +371,13 @@ def scp_to_host(local_file, host, remote_path, user="root", port=22, key=None, e
 
 
 
-def main():
-    local_file_path = "/etcd/etcd-release-3.4/raft_stats.csv"
-    for ip in IpToId:
-        ip_group.append(ip)
+async def run_once(local_file_path="/etcd/etcd-release-3.4/raft_stats.csv"):
     local_ip = get_local_ip()
-    leader_url = get_leader()
+    if local_ip not in CLUSTER_IPS:
+        # 本机不在集群里，不可能是 leader：不必去问 etcd
+        print(f"本机 IP {local_ip} 不是集群节点，跳过")
+        return
+    leader_url = await asyncio.to_thread(get_leader)
     leader_ip = extract_ip(leader_url)
 
     print(f"本机 IP: {local_ip}")
@@ -169,12 +385,45 @@ def main():
 
     if local_ip == leader_ip:
         print("✅ 本机是 Leader")
-        moveleader_demo(local_ip,leader_url,local_file_path)
+        await moveleader_demo(local_ip,leader_url,local_file_path)
 
 
     else:
         print("❌ 本机不是 Leader")
 
+
+async def daemon(interval):
+    """常驻模式：gRPC 连接、ssh 复用通道、本机 IP 在各轮之间复用，省掉每轮的解释器/etcdctl 启动"""
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=4))
+    try:
+        while True:
+            try:
+                await run_once()
+            except Exception as e:  # 单轮失败不退出常驻进程
+                print(f"⚠️ 本轮检查失败: {e}")
+            await asyncio.sleep(interval)
+    finally:
+        await close_ssh()
+
+
+async def check_once():
+    """单次模式：检查一轮后关掉缓存的 ssh 连接再退出"""
+    try:
+        await run_once()
+    finally:
+        await close_ssh()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--interval", type=float, default=0,
+                    help="大于 0 时常驻运行，每隔 interval 秒检查一次；默认只检查一次")
+    args = ap.parse_args()
+    if args.interval > 0:
+        asyncio.run(daemon(args.interval))
+    else:
+        asyncio.run(check_once())
+
 if __name__ == "__main__":
     
     main()
@@ -1,6 +1,5 @@
 #!/usr/bin/env python3
 import subprocess
-import time
 
 # 统一的基础参数
 BASE_CMD = [
@@ -18,18 +17,16 @@ intervals = [
 
 for dur, total_sec in intervals:
     print(f"\n=== Running with duration={dur}s for {total_sec}s ===")
-    start = time.time()
 
     proc = subprocess.Popen(
         BASE_CMD + ["--duration", str(dur)],  # 关闭对齐
     )
 
-    # 等待 20 min 或提前退出
-    while proc.poll() is None and (time.time() - start < total_sec):
-        time.sleep(5)
-
-    # 到达 20 min 或异常时终止
-    if proc.poll() is None:
+    # 阻塞等待 20 min 或提前退出（内核里等，不再每 5s 轮询）
+    try:
+        proc.wait(timeout=total_sec)
+    except subprocess.TimeoutExpired:
+        # 到达 20 min 仍在运行：终止
         proc.terminate()
         try:
             proc.wait(timeout=10)